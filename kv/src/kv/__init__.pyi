@@ -2,18 +2,27 @@ from ._abc import KV, InvalidData, InexistentItem, KVError, LocatableKV
 from .serialization import Parse, Dump, serializers, Serializers
 from .impl._dict import DictKV
 from .impl.fs import FilesystemKV
+from .impl.log import LogKV
 from .impl.sql import SQLKV
+from .impl.async_sql import AsyncSQLKV
+from .impl.sqlite import SQLiteKV
 from .impl.redis import RedisKV
 from .impl.http import ClientKV, ServerKV, Served
 from .impl.azure import BlobKV, BlobContainerKV, CosmosPartitionKV, CosmosContainerKV, CosmosKV
+from .cache import CachedKV
+from .shard import ShardedKV
+from .tiered import TieredKV
+from .buffered import BufferedKV
+from .transfer import CopyStats
 from .conn_strings import parse_type
 from .tests import test
 
 __all__ = [
   'KV', 'LocatableKV',
   'InvalidData', 'InexistentItem', 'KVError',
-  'DictKV', 'FilesystemKV', 'SQLKV', 'ClientKV', 'Served', 'ServerKV', 'RedisKV',
+  'DictKV', 'FilesystemKV', 'LogKV', 'SQLKV', 'AsyncSQLKV', 'SQLiteKV', 'ClientKV', 'Served', 'ServerKV', 'RedisKV',
   'BlobKV', 'BlobContainerKV', 'CosmosPartitionKV', 'CosmosContainerKV', 'CosmosKV',
+  'CachedKV', 'ShardedKV', 'TieredKV', 'BufferedKV', 'CopyStats',
   'parse_type', 'test',
   'Parse', 'Dump', 'serializers', 'Serializers', 'test',
 ]
\ No newline at end of file
@@ -1,7 +1,9 @@
-from typing_extensions import TypeVar, Generic, AsyncIterable, Literal, Any, TYPE_CHECKING, Self
+from typing_extensions import TypeVar, Generic, AsyncIterable, Awaitable, Iterable, Mapping, Sequence, Callable, Literal, Any, TYPE_CHECKING, Self, TypedDict, cast
 from abc import ABC, abstractmethod
 if TYPE_CHECKING:
   from datetime import datetime
+  from .transfer import CopyStats
+  from .serialization import Serializers
 from dataclasses import dataclass
 
 class StrMixin:
@@ -26,6 +28,87 @@ class InvalidData(KVError):
 T = TypeVar('T')
 U = TypeVar('U')
 
+CHUNK_SIZE = 4 * 2**20
+"""Default chunk size of `read_stream` (4 MiB)"""
+
+CLEAR_BATCH = 256
+"""Keys per `delete_many` in the default `clear()`"""
+
+async def gather_bounded(coros: Iterable[Awaitable[U]], *, max_concurrent: int = 16) -> list[U]:
+  """Like `asyncio.gather`, but running at most `max_concurrent` awaitables at a time"""
+  import asyncio
+  sem = asyncio.Semaphore(max_concurrent)
+  async def run(coro: Awaitable[U]) -> U:
+    async with sem:
+      return await coro
+  return await asyncio.gather(*[run(coro) for coro in coros])
+
+def item_pairs(items: Mapping[str, U] | Iterable[tuple[str, U]]) -> Iterable[tuple[str, U]]:
+  """`(key, value)` pairs of `insert_many` items (a mapping or an iterable of pairs)"""
+  if isinstance(items, Mapping):
+    return cast(Mapping[str, U], items).items()
+  return items
+
+def key_range(prefix: str = '', start: str | None = None, end: str | None = None) -> Callable[[str], bool]:
+  """Predicate of `keys()` filters: `key` starts with `prefix` and lies in `[start, end)`"""
+  return lambda key: key.startswith(prefix) and (start is None or start <= key) and (end is None or key < end)
+
+def prefix_end(prefix: str) -> str | None:
+  """Smallest string greater than every string starting with `prefix` (`None` if unbounded)"""
+  while prefix:
+    if ord(prefix[-1]) < 0x10FFFF:
+      return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    prefix = prefix[:-1]
+  return None
+
+async def filter_keys(
+  keys: AsyncIterable[str], *, prefix: str = '', start: str | None = None,
+  end: str | None = None, limit: int | None = None
+) -> AsyncIterable[str]:
+  """Apply `keys()` filters client-side, for backends that can't (fully) push them down"""
+  matches = key_range(prefix, start, end)
+  n = 0
+  try:
+    if limit is not None and limit <= 0:
+      return
+    async for key in keys:
+      if matches(key):
+        yield key
+        n += 1
+        if limit is not None and n >= limit:
+          return
+  finally:
+    if (aclose := getattr(keys, 'aclose', None)) is not None:
+      await aclose()
+
+class KeyFilters(TypedDict, total=False):
+  """Keyword filters of `KV.keys`"""
+  prefix: str
+  start: str
+  end: str
+  limit: int
+
+def list_keys(
+  kv: 'KV', *, prefix: str = '', start: str | None = None,
+  end: str | None = None, limit: int | None = None
+) -> AsyncIterable[str]:
+  """`kv.keys(...)`, passing only the filters in use. Subclasses predating the filters (`keys(self)`) get them applied client-side"""
+  filters: KeyFilters = {}
+  if prefix:
+    filters['prefix'] = prefix
+  if start is not None:
+    filters['start'] = start
+  if end is not None:
+    filters['end'] = end
+  if limit is not None:
+    filters['limit'] = limit
+  if not filters:
+    return kv.keys()
+  try:
+    return kv.keys(**filters)
+  except TypeError: # legacy `keys(self)`
+    return filter_keys(kv.keys(), prefix=prefix, start=start, end=end, limit=limit)
+
 class KV(ABC, Generic[T]):
   """Async, exception-free key-value store ABC"""
   
@@ -38,9 +121,12 @@ class KV(ABC, Generic[T]):
     and allows for additional parameters to be specified via the query string.
 
     Supported schemes:
+    - `memory://`: DictKV (in-memory)
     - `file://<path>`: FilesystemKV
+    - `log://<path>`: LogKV (append-only segment files)
     - `sqlite://<path>?table=<table>`: SQLiteKV (uses sqlite3)
     - `sql+<protocol>://<conn_str>?table=<table>`: SQLKV (uses SQLAlchemy)
+    - `sql+<protocol>+<async driver>://<conn_str>?table=<table>`: AsyncSQLKV (e.g. `sql+postgresql+asyncpg://...`, `sql+sqlite+aiosqlite://...`)
     - `azure+blob://<conn_str>`: BlobKV
     - `azure+blob://<conn_str>?container=<container_name>`: BlobContainerKV
     - `azure+cosmos://<conn_str>?db=<db>`: CosmosKV
@@ -48,6 +134,7 @@ class KV(ABC, Generic[T]):
     - `azure+cosmos://<conn_str>?db=<db>&container=<container>&partition=<partition>`: CosmosPartitionKV
     - `http://<endpoint>?token=<bearer>` or `https://<endpoint>?token=<bearer>`: ClientKV
     - `redis://<url>`, `rediss://<url>`, `redis+unix://<url>`: RedisKV
+    - `shard://<conn_str>|<conn_str>|...`: ShardedKV over the given stores
 
     Examples:
     >>> kv = KV.of('file://path/to/base?prefix=hello/')
@@ -83,22 +170,107 @@ class KV(ABC, Generic[T]):
 
   async def has(self, key: str) -> bool:
     """Does the `KV` have `key`?"""
-    async for k in self.keys():
-      if k == key:
-        return True
+    async for _ in list_keys(self, prefix=key, end=key + '\0', limit=1): # only `key` itself lies in [key, key + '\0')
+      return True
     return False
   
   @abstractmethod
-  def keys(self) -> AsyncIterable[str]:
-    """Read all keys in the `KV`"""
+  def keys(
+    self, *, prefix: str = '', start: str | None = None,
+    end: str | None = None, limit: int | None = None
+  ) -> AsyncIterable[str]:
+    """Read all keys in the `KV`, optionally filtered:
+    - `prefix`: only keys starting with `prefix`
+    - `start`, `end`: only keys in `[start, end)`
+    - `limit`: at most `limit` keys
+    
+    Backends push the filters down to the store where possible (so listing a small prefix doesn't scan every key).
+    Keys come in order for ordered stores (SQL, SQLite, blob), in arbitrary order otherwise
+    """
+
+  async def read_many(self, keys: Sequence[str], *, max_concurrent: int = 16) -> list[T | None]:
+    """Read many items at once. Returns `None` for inexistent keys (like `safe_read`), in the same order as `keys`"""
+    return await gather_bounded((self.safe_read(key) for key in keys), max_concurrent=max_concurrent)
+
+  async def insert_many(self, items: Mapping[str, T] | Iterable[tuple[str, T]], *, max_concurrent: int = 16):
+    """Insert many entries at once"""
+    await gather_bounded((self.insert(k, v) for k, v in item_pairs(items)), max_concurrent=max_concurrent)
+
+  async def delete_many(self, keys: Sequence[str], *, max_concurrent: int = 16):
+    """Delete many items at once. Inexistent keys are ignored"""
+    async def delete(key: str):
+      try:
+        await self.delete(key)
+      except InexistentItem:
+        ...
+    await gather_bounded((delete(key) for key in keys), max_concurrent=max_concurrent)
+
+  async def has_many(self, keys: Sequence[str], *, max_concurrent: int = 16) -> list[bool]:
+    """Check many keys at once, in the same order as `keys`"""
+    return await gather_bounded((self.has(key) for key in keys), max_concurrent=max_concurrent)
 
   async def values(self) -> AsyncIterable[T]:
     """Iterate over all values in the `KV`"""
     async for _, val in self.items():
       yield val
 
+  def raw(self) -> 'KV[bytes] | None':
+    """The same store, viewed over its serialized bytes (skipping `parse`/`dump`). `None` if values aren't stored as bytes"""
+    return None
+
+  def raw_serializers(self) -> 'Serializers[T] | None':
+    """Serializers between values and the bytes of `raw()` (`None` if `raw()` is `None`)"""
+    return None
+
+  def raw_compatible(self, other: 'KV') -> bool:
+    """Can raw bytes of `self` be inserted raw into `other`? I.e. both serialize values the same way, or `other` stores bytes as-is"""
+    from .serialization import default
+    src, dst = self.raw_serializers(), other.raw_serializers()
+    if src is None or dst is None:
+      return False
+    return src == dst or (dst['parse'] is default.parse and dst['dump'] is default.dump)
+
+  async def read_raw(self, key: str) -> bytes:
+    """Read the serialized bytes of item `key`, without parsing them. Raises `KVError` if values aren't stored as bytes"""
+    if (raw := self.raw()) is None:
+      raise KVError(f'{type(self).__name__} does not support raw reads')
+    return await raw.read(key)
+
+  async def insert_raw(self, key: str, data: bytes):
+    """Insert already serialized bytes, without validating them. Raises `KVError` if values aren't stored as bytes"""
+    if (raw := self.raw()) is None:
+      raise KVError(f'{type(self).__name__} does not support raw inserts')
+    await raw.insert(key, data)
+
+  async def read_stream(self, key: str, *, chunk_size: int = CHUNK_SIZE) -> AsyncIterable[bytes]:
+    """Stream the serialized bytes of item `key`, in chunks of (at most) `chunk_size`. Raises `InexistentItem` on first iteration.
+    Native on the filesystem, blob and HTTP backends. Otherwise reads the whole value first (`KVError` if it isn't stored as bytes)
+    """
+    data = await self.read_bytes(key)
+    for i in range(0, len(data), chunk_size):
+      yield data[i:i+chunk_size]
+
+  async def insert_stream(self, key: str, chunks: AsyncIterable[bytes]):
+    """Insert item `key` from a stream of serialized bytes, without validating them.
+    Native on the filesystem, blob and HTTP backends. Otherwise joins the chunks in memory first
+    """
+    data = b''.join([chunk async for chunk in chunks])
+    if self.raw() is not None:
+      await self.insert_raw(key, data)
+    else:
+      await self.insert(key, data) # type: ignore
+
+  async def read_bytes(self, key: str) -> bytes:
+    """Serialized bytes of item `key`: `read_raw`, or the value itself if the store doesn't serialize (e.g. a `DictKV[bytes]`)"""
+    data = await (self.read_raw(key) if self.raw() is not None else self.read(key))
+    if not isinstance(data, (bytes, bytearray, memoryview)):
+      raise KVError(f'{type(self).__name__} values are not stored as bytes')
+    return data # type: ignore
+
   async def copy(self, key: str, to: 'KV[T]', to_key: str):
-    """Copy `self[key]` to `to[to_key]`"""
+    """Copy `self[key]` to `to[to_key]` (as raw bytes, if `raw_compatible`)"""
+    if self.raw_compatible(to):
+      return await to.insert_raw(to_key, await self.read_raw(key))
     val = await self.read(key)
     await to.insert(to_key, val)
 
@@ -111,22 +283,44 @@ class KV(ABC, Generic[T]):
     """Rename `key` to `new_key`"""
     await self.move(key, self, new_key)
 
-  async def copy_all(self, to: 'KV[T]', *, max_concurrent: int = 16):
-    import asyncio
-    sem = asyncio.Semaphore(max_concurrent)
-    async def copy_one(key):
-      async with sem:
-        await self.copy(key, to, key)
-    await asyncio.gather(*[copy_one(key) async for key in self.keys()])
+  async def copy_all(
+    self, to: 'KV[T]', *, max_concurrent: int = 16, batch_size: int = 256,
+    checkpoint: str | None = None, progress: 'Callable[[CopyStats], Any] | None' = None,
+  ) -> 'CopyStats':
+    """Copy all items into `to`, in batches of `batch_size` keys processed by `max_concurrent` workers (see `kv.transfer.transfer`)
+    - `checkpoint`: path of a file recording copied keys, to resume an interrupted copy
+    - `progress`: called with the running `CopyStats` after every batch
+    """
+    from .transfer import transfer
+    return await transfer(self, to, max_concurrent=max_concurrent, batch_size=batch_size, checkpoint=checkpoint, progress=progress)
 
-  async def move_all(self, to: 'KV[T]', *, max_concurrent: int = 16):
-    await self.copy_all(to, max_concurrent=max_concurrent)
-    await self.clear()
+  async def move_all(
+    self, to: 'KV[T]', *, max_concurrent: int = 16, batch_size: int = 256,
+    checkpoint: str | None = None, progress: 'Callable[[CopyStats], Any] | None' = None,
+  ) -> 'CopyStats':
+    """Like `copy_all`, but deleting each batch from `self` once it's been written to `to`"""
+    from .transfer import transfer
+    return await transfer(self, to, move=True, max_concurrent=max_concurrent, batch_size=batch_size, checkpoint=checkpoint, progress=progress)
 
   async def clear(self):
-    """Delete all entries"""
+    """Delete all entries (with `delete_many`, `CLEAR_BATCH` keys at a time)"""
+    batch = []
     async for key in self.keys():
-      await self.delete(key)
+      batch.append(key)
+      if len(batch) >= CLEAR_BATCH:
+        await self.delete_many(batch)
+        batch = []
+    if batch:
+      await self.delete_many(batch)
+
+  async def aclose(self):
+    """Release resources (connections, pools, etc.) held by the `KV`. No-op by default"""
+
+  async def __aenter__(self) -> 'Self':
+    return self
+
+  async def __aexit__(self, *_):
+    await self.aclose()
 
   def prefixed(self, prefix: str, /) -> 'Self':
     """Create a `KV` with all keys prefixed with `prefix`, without nesting."""
@@ -0,0 +1,202 @@
+"""Reproducible benchmarks over any `KV[bytes]`. Run with `kv bench <conn_str>`, or:
+>>> results = await bench(KV.of('sqlite://bench.sqlite', bytes), workloads=['read', 'zipf'], sizes=[100, 10_000])
+"""
+from typing_extensions import Sequence, Callable, Awaitable, Iterable, Any, TypedDict
+from dataclasses import dataclass, asdict
+from itertools import accumulate
+import asyncio
+import random
+import resource
+import sys
+import time
+from urllib.parse import urlparse
+from kv import KV, DictKV
+
+WORKLOADS = ('write', 'read', 'mixed', 'zipf', 'scan', 'copy')
+"""
+- `write`: insert `n_keys` fresh keys
+- `read`: uniformly random point reads
+- `mixed`: 90% reads, 10% overwrites, uniformly random keys
+- `zipf`: point reads following a zipfian distribution (`s = 1.1`), i.e. a small hot set
+- `scan`: iterate all keys (one op per key)
+- `copy`: `copy_all` into an in-memory `DictKV` (one op per item)
+"""
+
+class Config(TypedDict):
+  """Parameters of a `bench` run, as recorded in its `report`"""
+  workloads: Sequence[str]
+  sizes: Sequence[int]
+  n_keys: int
+  ops: int
+  concurrency: int
+  max_bytes: int
+  seed: int
+
+@dataclass
+class Result:
+  workload: str
+  value_size: int
+  ops: int
+  seconds: float
+  ops_per_sec: float
+  p50_ms: float | None
+  """Median op latency (`None` for `scan`/`copy`, which aren't timed per op)"""
+  p99_ms: float | None
+  max_rss_mb: float
+  """Peak resident memory of the process so far"""
+
+  def __str__(self):
+    lat = f'p50 {self.p50_ms:.3f}ms, p99 {self.p99_ms:.3f}ms' if self.p50_ms is not None else ''
+    return f'{self.workload:<6} {fmt_size(self.value_size):>6}: {self.ops_per_sec:>10.0f} ops/s  {lat}'
+
+def fmt_size(n: int) -> str:
+  for unit, k in (('M', 10**6), ('k', 10**3)):
+    if n >= k and n % k == 0:
+      return f'{n // k}{unit}'
+  return str(n)
+
+def parse_size(s: str) -> int:
+  """`'100' -> 100`, `'10k' -> 10_000`, `'1M' -> 1_000_000`"""
+  s = s.strip()
+  mult = {'k': 10**3, 'K': 10**3, 'M': 10**6, 'G': 10**9}.get(s[-1:])
+  return int(float(s[:-1]) * mult) if mult else int(s)
+
+def max_rss_mb() -> float:
+  rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  return rss / 2**20 if sys.platform == 'darwin' else rss / 2**10 # bytes on macOS, KiB on Linux
+
+def percentile(xs: Sequence[float], p: float) -> float:
+  return xs[min(int(p * len(xs)), len(xs) - 1)]
+
+def zipf_sampler(n: int, rng: random.Random, s: float = 1.1) -> Callable[[], int]:
+  cum_weights = list(accumulate(1 / (i + 1)**s for i in range(n)))
+  # rank -> key index, shuffled so that hot keys aren't adjacent
+  order = list(range(n))
+  rng.shuffle(order)
+  return lambda: order[rng.choices(range(n), cum_weights=cum_weights)[0]]
+
+async def run_ops(ops: Iterable[Callable[[], Awaitable[Any]]], concurrency: int) -> list[float]:
+  """Run `ops` with `concurrency` workers. Returns each op's latency (seconds), sorted"""
+  it = iter(ops)
+  latencies = []
+  async def worker():
+    for op in it:
+      t0 = time.perf_counter()
+      await op()
+      latencies.append(time.perf_counter() - t0)
+  await asyncio.gather(*[worker() for _ in range(concurrency)])
+  return sorted(latencies)
+
+async def bench(
+  kv: KV[bytes], *, workloads: Sequence[str] = WORKLOADS, sizes: Sequence[int] = (100, 10_000, 1_000_000),
+  n_keys: int = 1000, ops: int = 10_000, concurrency: int = 16, max_bytes: int = 2**28, seed: int = 0,
+  prefix: str = 'kv-bench', progress: Callable[[Result], Any] | None = None,
+) -> list[Result]:
+  """Run `workloads` for each value size in `sizes`, under `kv.prefix(prefix)` (cleared before and after each size).
+  - `n_keys`: keys written per size (and read by the other workloads)
+  - `ops`: point operations per workload
+  - `max_bytes`: caps the data written (and read) per workload: large values use fewer keys/ops
+  - `seed`: keys, values and access patterns are fully determined by it
+  """
+  if unknown := set(workloads) - set(WORKLOADS):
+    raise ValueError(f'Unknown workloads: {", ".join(unknown)}. Available: {", ".join(WORKLOADS)}')
+  store = kv.prefix(prefix)
+  results: list[Result] = []
+
+  for size in sizes:
+    n = max(1, min(n_keys, max_bytes // size))
+    n_ops = max(1, min(ops, max_bytes // size))
+    rng = random.Random(f'{seed}-{size}')
+    keys = [f'key-{i:08d}' for i in range(n)]
+    values = [rng.randbytes(size) for _ in range(min(n, 16))] # reused cyclically, to bound memory
+    value = lambda i: values[i % len(values)]
+    await store.clear()
+
+    def record(workload: str, count: int, seconds: float, latencies: list[float] | None):
+      p50, p99 = (percentile(latencies, 0.5) * 1e3, percentile(latencies, 0.99) * 1e3) if latencies else (None, None)
+      r = Result(
+        workload=workload, value_size=size, ops=count, seconds=seconds,
+        ops_per_sec=count / seconds if seconds > 0 else float('inf'),
+        p50_ms=p50, p99_ms=p99, max_rss_mb=max_rss_mb(),
+      )
+      results.append(r)
+      if progress is not None:
+        progress(r)
+
+    async def timed(workload: str, ops: Iterable[Callable[[], Awaitable[Any]]]):
+      t0 = time.perf_counter()
+      latencies = await run_ops(ops, concurrency)
+      record(workload, len(latencies), time.perf_counter() - t0, latencies)
+
+    # every other workload needs the keys in place
+    populate = (lambda i=i: store.insert(keys[i], value(i)) for i in range(n))
+    if 'write' in workloads:
+      await timed('write', populate)
+    else:
+      await run_ops(populate, concurrency)
+
+    if 'read' in workloads:
+      idx = [rng.randrange(n) for _ in range(n_ops)]
+      await timed('read', (lambda i=i: store.read(keys[i]) for i in idx))
+
+    if 'mixed' in workloads:
+      idx = [(rng.randrange(n), rng.random() < 0.1) for _ in range(n_ops)]
+      await timed('mixed', (
+        (lambda i=i: store.insert(keys[i], value(i))) if write else (lambda i=i: store.read(keys[i]))
+        for i, write in idx
+      ))
+
+    if 'zipf' in workloads:
+      sample = zipf_sampler(n, rng)
+      idx = [sample() for _ in range(n_ops)]
+      await timed('zipf', (lambda i=i: store.read(keys[i]) for i in idx))
+
+    if 'scan' in workloads:
+      t0 = time.perf_counter()
+      count = 0
+      async for _ in store.keys():
+        count += 1
+      record('scan', count, time.perf_counter() - t0, None)
+
+    if 'copy' in workloads:
+      t0 = time.perf_counter()
+      stats = await store.copy_all(DictKV(), max_concurrent=concurrency)
+      record('copy', stats.copied, time.perf_counter() - t0, None)
+
+    await store.clear()
+
+  return results
+
+async def bench_offload(
+  path: str, *, workloads: Sequence[str] = ('read', 'mixed', 'zipf'), sizes: Sequence[int] = (100, 10_000, 1_000_000),
+  n_keys: int = 1000, ops: int = 10_000, concurrency: int = 16, max_bytes: int = 2**28, seed: int = 0,
+  progress: Callable[[Result], Any] | None = None,
+) -> list[tuple[Result, Result]]:
+  """Run the same workloads against a `FilesystemKV` at `path`, first with file I/O inline on the event loop, then offloaded to a thread pool (`offload=True`).
+  Returns `(inline, offloaded)` result pairs
+  """
+  from kv import FilesystemKV
+  runs: list[list[Result]] = []
+  for offload in (False, True):
+    async with FilesystemKV.new(path, offload=offload) as kv:
+      runs.append(await bench(
+        kv, workloads=workloads, sizes=sizes, n_keys=n_keys, ops=ops, concurrency=concurrency,
+        max_bytes=max_bytes, seed=seed, prefix='kv-bench-offload', progress=progress,
+      ))
+  return list(zip(*runs))
+
+def compare(results: Sequence[Result], baseline: Sequence[dict], *, tolerance: float = 0.2) -> list[tuple[Result, float]]:
+  """Throughput of `results` relative to a `baseline` (as saved by `kv bench --json`), for matching workload/size pairs.
+  Returns the `(result, ratio)` pairs that regressed by more than `tolerance` (e.g. `0.2` = 20% slower)"""
+  base = {(b['workload'], b['value_size']): b['ops_per_sec'] for b in baseline}
+  return [
+    (r, ratio) for r in results
+    if (b := base.get((r.workload, r.value_size))) and (ratio := r.ops_per_sec / b) < 1 - tolerance
+  ]
+
+def report(conn_str: str, results: Sequence[Result], config: Config) -> dict:
+  """JSON-serializable report. Only the scheme of `conn_str` is kept, as it may contain credentials"""
+  return {
+    'backend': urlparse(conn_str).scheme, 'config': config, 'python': sys.version.split()[0],
+    'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'results': [asdict(r) for r in results],
+  }
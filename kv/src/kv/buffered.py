@@ -0,0 +1,187 @@
+from typing_extensions import TypeVar, Generic, Any, Sequence, Mapping, Iterable, AsyncIterable
+from dataclasses import dataclass, field
+import asyncio
+from kv import KV, InexistentItem
+from kv._abc import filter_keys, list_keys, key_range, item_pairs
+
+T = TypeVar('T')
+
+DELETED: Any = object()
+"""Buffered delete"""
+
+MISSING: Any = object()
+"""Not buffered"""
+
+@dataclass
+class BufferedKV(KV[T], Generic[T]):
+  """Write-behind buffer in front of `kv`. Writes are held in memory (repeated writes to a key coalesce into one) and flushed in batches,
+  with `insert_many`/`delete_many`, once `max_items` keys are pending or `max_delay` seconds after the first pending write, and on `aclose()`.
+  Reads see the buffered writes.
+  - `max_items`: pending keys that trigger a flush (the triggering write waits for it)
+  - `max_delay`: seconds a write may stay buffered (`None` to only flush on `max_items`, `flush()` and `aclose()`)
+
+  Buffered writes are lost if the process dies before flushing them.
+  """
+  kv: KV[T]
+  max_items: int = 1000
+  max_delay: float | None = 1.0
+  max_concurrent: int = 16
+  writes: int = field(default=0, init=False)
+  flushed: int = field(default=0, init=False)
+
+  def __post_init__(self):
+    self.pending: dict[str, T] = {}
+    self.flushing: dict[str, T] = {}
+    """Batch being flushed (still visible to reads)"""
+    self.lock = asyncio.Lock()
+    self.timer: asyncio.Task | None = None
+    self.error: BaseException | None = None
+    """Last background flush error"""
+
+  def __repr__(self):
+    return f'BufferedKV({self.kv!r}, pending={len(self.pending)})'
+
+  def buffered(self, key: str) -> Any:
+    """Buffered value of `key` (`DELETED` if deleted), or `MISSING` if not buffered"""
+    if key in self.pending:
+      return self.pending[key]
+    return self.flushing.get(key, MISSING)
+
+  async def buffer(self, items: Iterable[tuple[str, Any]]):
+    for key, value in items:
+      self.pending[key] = value
+      self.writes += 1
+    if len(self.pending) >= self.max_items:
+      await self.flush()
+    elif self.pending and self.timer is None and self.max_delay is not None:
+      self.timer = asyncio.get_running_loop().create_task(self._flush_later(self.max_delay))
+
+  async def _flush_later(self, delay: float):
+    await asyncio.sleep(delay)
+    self.timer = None
+    try:
+      await self.flush()
+    except asyncio.CancelledError:
+      raise
+    except BaseException as e:
+      self.error = e
+      if self.pending and self.timer is None: # retry later
+        self.timer = asyncio.get_running_loop().create_task(self._flush_later(delay))
+
+  async def flush(self):
+    """Write all pending writes to `kv`. On failure, they're kept pending (unless overwritten meanwhile)"""
+    async with self.lock:
+      if not self.pending:
+        return
+      self.flushing, self.pending = self.pending, {}
+      inserts = [(k, v) for k, v in self.flushing.items() if v is not DELETED]
+      deletes = [k for k, v in self.flushing.items() if v is DELETED]
+      try:
+        await asyncio.gather(
+          *([self.kv.insert_many(inserts, max_concurrent=self.max_concurrent)] if inserts else []),
+          *([self.kv.delete_many(deletes, max_concurrent=self.max_concurrent)] if deletes else []),
+        )
+      except BaseException:
+        self.pending = {**self.flushing, **self.pending}
+        raise
+      else:
+        self.flushed += len(self.flushing)
+      finally:
+        self.flushing = {}
+
+  async def insert(self, key: str, value: T):
+    await self.buffer([(key, value)])
+
+  async def insert_many(self, items: Mapping[str, T] | Iterable[tuple[str, T]], *, max_concurrent: int = 16):
+    await self.buffer(item_pairs(items))
+
+  async def delete(self, key: str):
+    if (value := self.buffered(key)) is DELETED or (value is MISSING and not await self.kv.has(key)):
+      raise InexistentItem(key)
+    await self.buffer([(key, DELETED)])
+
+  async def delete_many(self, keys: Sequence[str], *, max_concurrent: int = 16):
+    await self.buffer((key, DELETED) for key in keys)
+
+  async def read(self, key: str) -> T:
+    if (value := self.buffered(key)) is DELETED:
+      raise InexistentItem(key)
+    if value is not MISSING:
+      return value
+    return await self.kv.read(key)
+
+  async def read_many(self, keys: Sequence[str], *, max_concurrent: int = 16) -> list[T | None]:
+    buffered = [self.buffered(key) for key in keys]
+    missing = [key for key, value in zip(keys, buffered) if value is MISSING]
+    read = iter(await self.kv.read_many(missing, max_concurrent=max_concurrent) if missing else [])
+    return [next(read) if value is MISSING else None if value is DELETED else value for value in buffered]
+
+  async def has(self, key: str) -> bool:
+    if (value := self.buffered(key)) is not MISSING:
+      return value is not DELETED
+    return await self.kv.has(key)
+
+  async def has_many(self, keys: Sequence[str], *, max_concurrent: int = 16) -> list[bool]:
+    buffered = [self.buffered(key) for key in keys]
+    missing = [key for key, value in zip(keys, buffered) if value is MISSING]
+    has = iter(await self.kv.has_many(missing, max_concurrent=max_concurrent) if missing else [])
+    return [next(has) if value is MISSING else value is not DELETED for value in buffered]
+
+  def overlay(self) -> dict[str, Any]:
+    return {**self.flushing, **self.pending}
+
+  async def keys(self, *, prefix: str = '', start: str | None = None, end: str | None = None, limit: int | None = None):
+    """Keys of `kv` (minus buffered deletes), then buffered inserts not in `kv`"""
+    overlay = self.overlay()
+    async def union():
+      seen = set()
+      async for key in list_keys(self.kv, prefix=prefix, start=start, end=end):
+        if key in overlay:
+          seen.add(key)
+          if overlay[key] is DELETED:
+            continue
+        yield key
+      matches = key_range(prefix, start, end)
+      for key, value in overlay.items():
+        if value is not DELETED and key not in seen and matches(key):
+          yield key
+    async for key in filter_keys(union(), limit=limit):
+      yield key
+
+  async def items(self):
+    overlay = self.overlay()
+    async for key, value in self.kv.items():
+      if key not in overlay:
+        yield key, value
+    for key, value in overlay.items():
+      if value is not DELETED:
+        yield key, value
+
+  async def read_stream(self, key: str, **kwargs):
+    if self.buffered(key) is not MISSING:
+      await self.flush()
+    async for chunk in self.kv.read_stream(key, **kwargs):
+      yield chunk
+
+  async def insert_stream(self, key: str, chunks: AsyncIterable[bytes], **kwargs):
+    async with self.lock: # no older buffered value may land afterwards
+      self.pending.pop(key, None)
+      await self.kv.insert_stream(key, chunks, **kwargs)
+
+  async def clear(self):
+    async with self.lock:
+      self.pending.clear()
+      await self.kv.clear()
+
+  async def aclose(self):
+    """Flush pending writes, then close `kv`"""
+    if self.timer is not None:
+      self.timer.cancel()
+      self.timer = None
+    await self.flush()
+    await self.kv.aclose()
+
+  @property
+  def coalesced(self) -> float:
+    """Fraction of writes absorbed by the buffer (overwritten before reaching `kv`)"""
+    return 1 - (self.flushed + len(self.pending)) / self.writes if self.writes else 0.0
@@ -0,0 +1,285 @@
+from typing_extensions import TypeVar, Generic, Callable, Literal, Any, Sequence, Mapping, Iterable, AsyncIterable
+from dataclasses import dataclass, field
+from collections import OrderedDict
+from contextlib import contextmanager
+import sys
+import time
+from kv import KV, InexistentItem
+from kv._abc import list_keys, item_pairs
+
+T = TypeVar('T')
+
+MISSING: Any = object()
+"""Negative cache entry: the key is known not to exist"""
+
+def default_sizeof(value) -> int:
+  """Approximate size of `value`: byte length of bytes and strings, `sys.getsizeof` of anything else, recursing into dicts, lists, tuples, sets and object attributes"""
+  if isinstance(value, (bytes, bytearray, memoryview)):
+    return len(value)
+  if isinstance(value, str):
+    return len(value.encode())
+  size = sys.getsizeof(value)
+  if isinstance(value, dict):
+    return size + sum(default_sizeof(k) + default_sizeof(v) for k, v in value.items())
+  if isinstance(value, (list, tuple, set, frozenset)):
+    return size + sum(default_sizeof(x) for x in value)
+  if hasattr(value, '__dict__'): # e.g. pydantic models, dataclasses
+    return size + default_sizeof(vars(value))
+  return size
+
+@dataclass
+class Entry(Generic[T]):
+  value: T
+  size: int
+  expires_at: float | None
+
+class LRU:
+  """Least-recently-used eviction order"""
+  def __init__(self):
+    self.order: OrderedDict[str, None] = OrderedDict()
+
+  def add(self, key: str):
+    self.order[key] = None
+
+  def touch(self, key: str):
+    self.order.move_to_end(key)
+
+  def remove(self, key: str):
+    self.order.pop(key, None)
+
+  def victim(self) -> str:
+    return next(iter(self.order))
+
+  def clear(self):
+    self.order.clear()
+
+class LFU:
+  """Least-frequently-used eviction order (ties broken by recency). O(1), except `remove` emptying the lowest frequency bucket (O(distinct frequencies))"""
+  def __init__(self):
+    self.freq: dict[str, int] = {}
+    self.buckets: dict[int, OrderedDict[str, None]] = {}
+    self.min_freq = 0
+
+  def add(self, key: str):
+    self.freq[key] = 1
+    self.buckets.setdefault(1, OrderedDict())[key] = None
+    self.min_freq = 1
+
+  def touch(self, key: str):
+    f = self.freq[key]
+    bucket = self.buckets[f]
+    del bucket[key]
+    if not bucket:
+      del self.buckets[f]
+      if self.min_freq == f:
+        self.min_freq = f + 1
+    self.freq[key] = f + 1
+    self.buckets.setdefault(f + 1, OrderedDict())[key] = None
+
+  def remove(self, key: str):
+    if (f := self.freq.pop(key, None)) is None:
+      return
+    bucket = self.buckets[f]
+    del bucket[key]
+    if not bucket:
+      del self.buckets[f]
+      if self.min_freq == f:
+        self.min_freq = min(self.buckets, default=0)
+
+  def victim(self) -> str:
+    return next(iter(self.buckets[self.min_freq]))
+
+  def clear(self):
+    self.freq.clear()
+    self.buckets.clear()
+    self.min_freq = 0
+
+@dataclass
+class CachedKV(KV[T], Generic[T]):
+  """In-process read-through cache in front of `kv`. Writes and deletes go through to `kv` and invalidate the cached entries.
+  - `max_items`/`max_bytes`: cache budget (`None` for unbounded). Entry sizes are estimated with `sizeof`, so `max_bytes` is approximate
+  - `ttl`: seconds an entry stays valid (`None` for no expiry)
+  - `policy`: eviction policy, `'lru'` or `'lfu'`
+  - `cache_misses`: whether to cache inexistent keys (negative caching)
+  """
+  kv: KV[T]
+  max_items: int | None = 1024
+  max_bytes: int | None = None
+  ttl: float | None = None
+  policy: Literal['lru', 'lfu'] = 'lru'
+  cache_misses: bool = True
+  sizeof: Callable[[T], int] = default_sizeof
+  hits: int = field(default=0, init=False)
+  misses: int = field(default=0, init=False)
+
+  def __post_init__(self):
+    self.entries: dict[str, Entry] = {}
+    self.order = LRU() if self.policy == 'lru' else LFU()
+    self.size = 0
+    self.fetches: dict[str, int] = {}
+    """In-flight fetches per key"""
+    self.versions: dict[str, int] = {}
+    """Invalidations per key during its in-flight fetches"""
+
+  def __repr__(self):
+    return f'CachedKV({self.kv!r}, policy={self.policy!r}, items={len(self.entries)}, bytes={self.size})'
+
+  def lookup(self, key: str) -> Entry | None:
+    """Cached entry of `key` (with value `MISSING` if known to be inexistent), or `None` if not cached or expired"""
+    if (entry := self.entries.get(key)) is None:
+      self.misses += 1
+      return None
+    if entry.expires_at is not None and entry.expires_at <= time.monotonic():
+      self.drop(key)
+      self.misses += 1
+      return None
+    self.hits += 1
+    self.order.touch(key)
+    return entry
+
+  def store(self, key: str, value: T):
+    if value is MISSING and not self.cache_misses:
+      return
+    self.drop(key)
+    size = 0 if value is MISSING else self.sizeof(value)
+    if self.max_bytes is not None and size > self.max_bytes:
+      return
+    expires_at = None if self.ttl is None else time.monotonic() + self.ttl
+    self.entries[key] = Entry(value, size, expires_at)
+    self.order.add(key)
+    self.size += size
+    while (
+      (self.max_items is not None and len(self.entries) > self.max_items)
+      or (self.max_bytes is not None and self.size > self.max_bytes)
+    ):
+      self.drop(self.order.victim())
+
+  @contextmanager
+  def fetching(self, keys: Iterable[str]):
+    """Track in-flight fetches of `keys`. Yields `store(key, value)`, which skips keys invalidated meanwhile (so stale values aren't cached)"""
+    keys = list(dict.fromkeys(keys))
+    versions = {}
+    for key in keys:
+      self.fetches[key] = self.fetches.get(key, 0) + 1
+      versions[key] = self.versions.get(key, 0)
+    def store(key: str, value):
+      if self.versions.get(key, 0) == versions[key]:
+        self.store(key, value)
+    try:
+      yield store
+    finally:
+      for key in keys:
+        if (n := self.fetches.pop(key) - 1):
+          self.fetches[key] = n
+        else:
+          self.versions.pop(key, None)
+
+  def invalidate(self, key: str | None = None):
+    """Drop `key` from the cache (or the whole cache, if `key` is `None`). In-flight reads of it won't be cached"""
+    for k in self.fetches if key is None else [key] if key in self.fetches else []:
+      self.versions[k] = self.versions.get(k, 0) + 1
+    self.drop(key)
+
+  def drop(self, key: str | None = None):
+    """Evict `key` (or everything, if `key` is `None`)"""
+    if key is None:
+      self.entries.clear()
+      self.order.clear()
+      self.size = 0
+    elif (entry := self.entries.pop(key, None)) is not None:
+      self.order.remove(key)
+      self.size -= entry.size
+
+  async def read(self, key: str) -> T:
+    if (entry := self.lookup(key)) is not None:
+      if entry.value is MISSING:
+        raise InexistentItem(key)
+      return entry.value
+    with self.fetching([key]) as store:
+      try:
+        value = await self.kv.read(key)
+      except InexistentItem:
+        store(key, MISSING)
+        raise
+      store(key, value)
+    return value
+
+  async def has(self, key: str) -> bool:
+    if (entry := self.lookup(key)) is not None:
+      return entry.value is not MISSING
+    with self.fetching([key]) as store:
+      has = await self.kv.has(key)
+      if not has:
+        store(key, MISSING)
+    return has
+
+  async def insert(self, key: str, value: T):
+    try:
+      await self.kv.insert(key, value)
+    finally:
+      self.invalidate(key)
+
+  async def delete(self, key: str):
+    try:
+      await self.kv.delete(key)
+    finally:
+      self.invalidate(key)
+
+  def read_stream(self, key: str, **kwargs):
+    """Streams from the underlying store (large values aren't cached)"""
+    return self.kv.read_stream(key, **kwargs)
+
+  async def insert_stream(self, key: str, chunks: AsyncIterable[bytes], **kwargs):
+    try:
+      await self.kv.insert_stream(key, chunks, **kwargs)
+    finally:
+      self.invalidate(key)
+
+  async def read_many(self, keys: Sequence[str], *, max_concurrent: int = 16) -> list[T | None]:
+    found: dict[str, T | None] = {}
+    for key in keys:
+      if (entry := self.lookup(key)) is not None:
+        found[key] = None if entry.value is MISSING else entry.value
+    missing = [key for key in dict.fromkeys(keys) if key not in found]
+    if missing:
+      with self.fetching(missing) as store:
+        for key, value in zip(missing, await self.kv.read_many(missing, max_concurrent=max_concurrent)):
+          if value is not None: # `None` may also be a stored value, so it isn't negatively cached
+            store(key, value)
+          found[key] = value
+    return [found[key] for key in keys]
+
+  async def insert_many(self, items: Mapping[str, T] | Iterable[tuple[str, T]], *, max_concurrent: int = 16):
+    pairs = list(item_pairs(items))
+    try:
+      await self.kv.insert_many(pairs, max_concurrent=max_concurrent)
+    finally:
+      for key, _ in pairs:
+        self.invalidate(key)
+
+  async def delete_many(self, keys: Sequence[str], *, max_concurrent: int = 16):
+    try:
+      await self.kv.delete_many(keys, max_concurrent=max_concurrent)
+    finally:
+      for key in keys:
+        self.invalidate(key)
+
+  def keys(self, *, prefix: str = '', start: str | None = None, end: str | None = None, limit: int | None = None):
+    return list_keys(self.kv, prefix=prefix, start=start, end=end, limit=limit)
+
+  def items(self):
+    return self.kv.items()
+
+  async def clear(self):
+    try:
+      await self.kv.clear()
+    finally:
+      self.invalidate()
+
+  def aclose(self):
+    return self.kv.aclose()
+
+  @property
+  def hit_rate(self) -> float:
+    total = self.hits + self.misses
+    return self.hits / total if total else 0.0
@@ -15,7 +15,7 @@ def test(conn_str: str):
   """Performs some basic tests on `KV.of(conn_str)`"""
   import asyncio
   from dslog import Logger
-  from kv import KV, SQLKV
+  from kv import KV, SQLKV, AsyncSQLKV
   from kv.tests import test_bool, test_bytes, test_dict, test_float, test_int, test_list, test_str
   logger = Logger.click().prefix('[TEST]')
   async def tests():
@@ -34,6 +34,10 @@ def test(conn_str: str):
       
       if isinstance(kv, SQLKV):
         kv.Base.metadata.drop_all(kv.engine)
+      elif isinstance(kv, AsyncSQLKV):
+        async with kv.engine.begin() as conn:
+          await conn.run_sync(kv.Base.metadata.drop_all)
+        await kv.aclose()
         
     return results
 
@@ -59,19 +63,127 @@ def serve(
 
   uvicorn.run(app, host=host, port=port)
 
-# @app.command()
-# def copy(
-#   input: str = typer.Option(..., '-i', '--input', help='Input KV connection string'),
-#   output: str = typer.Option(..., '-o', '--output', help='Output KV connection string'),
-#   verbose: bool = typer.Option(False, '-v', '--verbose'),
-#   type: str = typer.Option('bytes', '--type', help='Datatype. Supports: dict, list, set, str, int, float, bool, bytes (default)'),
-# ):
-#   from kv import KV, parse_type
-#   t = parse_type(type)
-#   import asyncio
-
-#   async def copy():
-#     inp = KV.of(input, t)
-#     out = KV.of(output, t)
-
-#   asyncio.run(copy())
\ No newline at end of file
+@app.command()
+def copy(
+  input: str = typer.Option(..., '-i', '--input', help='Input KV connection string'),
+  output: str = typer.Option(..., '-o', '--output', help='Output KV connection string'),
+  type: str = typer.Option('any', '--type', help='Datatype. Supports: any (default), dict, list, set, str, int, float, bool, bytes. Values are copied as stored (without parsing) when both stores encode them the same way'),
+  parallel: int = typer.Option(16, '-p', '--parallel', help='Concurrent workers'),
+  batch_size: int = typer.Option(256, '-b', '--batch-size', help='Keys read/written per batch'),
+  checkpoint: str = typer.Option('', '-c', '--checkpoint', help='File recording copied keys. Re-run with the same file to resume an interrupted copy'),
+  verify: int = typer.Option(0, '--verify', help='Afterwards, compare N randomly sampled keys between input and output'),
+  count: bool = typer.Option(False, '--count', help='Count input keys first, to report an ETA'),
+  move: bool = typer.Option(False, '--move', help='Delete items from the input once copied'),
+  quiet: bool = typer.Option(False, '-q', '--quiet', help="Don't report progress"),
+):
+  """Copy (or move) all items from `input` to `output`"""
+  import sys
+  import time
+  import random
+  import asyncio
+  from kv import KV, CopyStats, parse_type
+  from kv.transfer import transfer
+
+  if verify and move:
+    raise typer.BadParameter("can't verify a move (the input is deleted)", param_hint='--verify')
+
+  t = parse_type(type)
+  last_report = 0.0
+
+  def report(stats: CopyStats, *, force: bool = False):
+    nonlocal last_report
+    if not quiet and (force or time.monotonic() - last_report >= 1):
+      last_report = time.monotonic()
+      print(f'\r{stats}', end='', file=sys.stderr, flush=True)
+
+  async def sample(kv: KV, n: int) -> list[str]:
+    """Reservoir sample of `n` keys"""
+    keys: list[str] = []
+    i = 0
+    async for key in kv.keys():
+      if len(keys) < n:
+        keys.append(key)
+      elif (j := random.randrange(i + 1)) < n:
+        keys[j] = key
+      i += 1
+    return keys
+
+  async def run():
+    async with KV.of(input, t) as inp, KV.of(output, t) as out:
+      total = None
+      if count:
+        total = 0
+        async for _ in inp.keys():
+          total += 1
+      stats = await transfer(
+        inp, out, move=move, max_concurrent=parallel, batch_size=batch_size,
+        checkpoint=checkpoint or None, total=total, progress=report,
+      )
+      report(stats, force=True)
+      if not quiet:
+        print(f'\nDone in {stats.elapsed:.1f}s', file=sys.stderr)
+
+      if verify:
+        keys = await sample(inp, verify)
+        expected, actual = await inp.read_many(keys), await out.read_many(keys)
+        mismatches = [k for k, x, y in zip(keys, expected, actual) if x != y]
+        print(f'Verified {len(keys)} sampled keys: {len(mismatches)} mismatches', file=sys.stderr)
+        for key in mismatches[:10]:
+          print(f'  - {key!r}', file=sys.stderr)
+        if mismatches:
+          raise typer.Exit(1)
+
+  asyncio.run(run())
+
+@app.command()
+def bench(
+  conn_str: str = typer.Argument(..., help='KV connection string (values are stored as bytes, under --prefix)'),
+  workloads: str = typer.Option(','.join(['write', 'read', 'mixed', 'zipf', 'scan', 'copy']), '-w', '--workloads', help='Comma-separated workloads: write, read, mixed, zipf, scan, copy'),
+  sizes: str = typer.Option('100,10k,1M', '-s', '--sizes', help='Comma-separated value sizes in bytes (e.g. 100,10k,1M,10M)'),
+  n_keys: int = typer.Option(1000, '-n', '--keys', help='Keys written per value size'),
+  ops: int = typer.Option(10_000, '--ops', help='Point operations per workload'),
+  concurrency: int = typer.Option(16, '-c', '--concurrency', help='Concurrent operations'),
+  max_bytes: str = typer.Option('256M', '--max-bytes', help='Cap on data written/read per workload (large values use fewer keys/ops)'),
+  seed: int = typer.Option(0, '--seed'),
+  prefix: str = typer.Option('kv-bench', '--prefix', help='Prefix the benchmark runs (and clears) under'),
+  json_path: str = typer.Option('', '--json', help='Write results as JSON to this file ("-" for stdout)'),
+  baseline: str = typer.Option('', '--baseline', help='JSON results of a previous run. Exit with code 1 if throughput regressed more than --tolerance'),
+  tolerance: float = typer.Option(0.2, '--tolerance', help='Allowed throughput drop vs. --baseline (0.2 = 20%)'),
+):
+  """Benchmark `KV.of(conn_str)` with reproducible workloads: ops/s, p50/p99 latency and peak memory"""
+  import sys
+  import json
+  import asyncio
+  from kv import KV
+  from kv.bench import Config, bench as run_bench, parse_size, report, compare
+
+  config = Config(
+    workloads=workloads.split(','), sizes=[parse_size(s) for s in sizes.split(',')], n_keys=n_keys,
+    ops=ops, concurrency=concurrency, max_bytes=parse_size(max_bytes), seed=seed,
+  )
+  out = sys.stderr if json_path == '-' else sys.stdout
+
+  async def run():
+    async with KV.of(conn_str, bytes) as kv:
+      return await run_bench(kv, **config, prefix=prefix, progress=lambda r: print(r, file=out, flush=True))
+
+  try:
+    results = asyncio.run(run())
+  except ValueError as e:
+    raise typer.BadParameter(str(e))
+
+  if json_path:
+    data = json.dumps(report(conn_str, results, config), indent=2)
+    if json_path == '-':
+      print(data)
+    else:
+      with open(json_path, 'w') as f:
+        f.write(data)
+
+  if baseline:
+    with open(baseline) as f:
+      regressions = compare(results, json.load(f)['results'], tolerance=tolerance)
+    for r, ratio in regressions:
+      print(f'REGRESSION {r.workload} {r.value_size}B: {ratio:.0%} of baseline throughput', file=out)
+    if regressions:
+      raise typer.Exit(1)
@@ -1,4 +1,4 @@
-from typing_extensions import TypeVar, Any
+from typing_extensions import TypeVar, Any, Literal
 from urllib.parse import urlparse, parse_qs, unquote
 from pydantic import BaseModel
 from kv import KV
@@ -30,21 +30,48 @@ class Params(BaseModel):
   prefix: str | None = None
   type: str = 'any'
 
+class CodecParams(Params):
+  """For backends storing values as bytes (see `kv.serializers`)"""
+  format: str = 'json'
+  compression: str | None = None
+
 class HTTPParams(Params):
   secret: str | None = None
+  http2: bool = False
+  timeout: float | None = None
 
-class AzureBlobParams(Params):
+class AzureBlobParams(CodecParams):
   container: str | None = None
+  pooled: bool = False
 
 class CosmosParams(Params):
   db: str
   container: str | None = None
   partition: str | None = None
 
+class FilesystemParams(CodecParams):
+  offload: bool = False
+  fsync: Literal['never', 'always', 'batch'] = 'never'
+
+class LogParams(CodecParams):
+  sync: bool = False
+
 class SQLParams(Params):
   table: str
+  pool_size: int | None = None
+  max_overflow: int | None = None
+
+class RedisParams(CodecParams):
+  scan_count: int = 1000
+
+class SQLiteParams(CodecParams):
+  table: str = 'kv'
 
 def parse(conn_str: str, type: type[T]) -> KV[T]:
+  if conn_str.startswith('shard://'): # 'shard://file://a|file://b'
+    from kv import ShardedKV
+    return ShardedKV([parse(shard, type) for shard in conn_str.removeprefix('shard://').split('|')])
+
   parsed_url = urlparse(conn_str) # 'file://path/to/base?prefix=hello'
   scheme = parsed_url.scheme # 'file'
   netloc = parsed_url.netloc # 'path'
@@ -53,25 +80,25 @@ def parse(conn_str: str, type: type[T]) -> KV[T]:
   query = parse_qs(parsed_url.query) # { 'prefix': ['hello'] }
   query = { k: v[0] for k, v in query.items() }
 
-  params = Params(**query)
+  params = Params.model_validate(query)
   type = type or parse_type(params.type)
 
   if scheme in ('http', 'https'):
-    params = HTTPParams(**query)
+    params = HTTPParams.model_validate(query)
     from kv import ClientKV
     url = f'{scheme}://{endpoint}'
-    kv = ClientKV.new(url, type, secret=params.secret)
+    kv = ClientKV.new(url, type, secret=params.secret, http2=params.http2, timeout=params.timeout)
 
   elif scheme == 'azure+blob':
-    params = AzureBlobParams(**query)
+    params = AzureBlobParams.model_validate(query)
     from kv import BlobKV, BlobContainerKV
     if params.container:
-      kv = BlobContainerKV.from_conn_str(endpoint, params.container, type)
+      kv = BlobContainerKV.from_conn_str(endpoint, params.container, type, pooled=params.pooled, format=params.format, compression=params.compression)
     else:
-      kv = BlobKV.from_conn_str(endpoint, type)
+      kv = BlobKV.from_conn_str(endpoint, type, pooled=params.pooled, format=params.format, compression=params.compression)
 
   elif scheme == 'azure+cosmos':
-    params = CosmosParams(**query)
+    params = CosmosParams.model_validate(query)
     from kv import CosmosKV, CosmosContainerKV, CosmosPartitionKV
     if params.container and params.partition:
       kv = CosmosPartitionKV.from_conn_str(endpoint, type, db=params.db, container=params.container, partition_key=params.partition)
@@ -81,22 +108,43 @@ def parse(conn_str: str, type: type[T]) -> KV[T]:
       kv = CosmosKV.from_conn_str(endpoint, type, db=params.db)
 
   elif scheme.startswith('sql+'):
-    params = SQLParams(**query)
-    from kv import SQLKV
+    params = SQLParams.model_validate(query)
+    from sqlalchemy import make_url
     proto = scheme.removeprefix('sql+')
     url = f'{proto}://{endpoint}'
-    kv = SQLKV.new(url, type, table=params.table)
+    if make_url(url).get_dialect().is_async: # e.g. sql+postgresql+asyncpg://..., sql+sqlite+aiosqlite://...
+      from kv import AsyncSQLKV
+      kv = AsyncSQLKV.new(url, type, table=params.table, pool_size=params.pool_size, max_overflow=params.max_overflow)
+    else:
+      from kv import SQLKV
+      kv = SQLKV.new(url, type, table=params.table, pool_size=params.pool_size, max_overflow=params.max_overflow)
+
+  elif scheme == 'sqlite':
+    params = SQLiteParams.model_validate(query)
+    from kv import SQLiteKV
+    kv = SQLiteKV.new(endpoint, type, table=params.table, format=params.format, compression=params.compression)
 
   elif scheme == 'file':
+    params = FilesystemParams.model_validate(query)
     from kv import FilesystemKV
-    kv = FilesystemKV.new(endpoint, type)
+    kv = FilesystemKV.new(endpoint, type, offload=params.offload, fsync=params.fsync, format=params.format, compression=params.compression)
+
+  elif scheme == 'log':
+    params = LogParams.model_validate(query)
+    from kv import LogKV
+    kv = LogKV.new(endpoint, type, sync=params.sync, format=params.format, compression=params.compression)
+
+  elif scheme == 'memory':
+    from kv import DictKV
+    kv = DictKV()
 
   elif scheme.startswith('redis'):
+    params = RedisParams.model_validate(query)
     if scheme.startswith('redis+'):
       scheme = scheme.removeprefix('redis+')
     url = f'{scheme}://{endpoint}'
     from kv import RedisKV
-    kv = RedisKV.from_url(url, type)
+    kv = RedisKV.from_url(url, type, scan_count=params.scan_count, format=params.format, compression=params.compression)
 
   else:
     raise ValueError(f'Unknown scheme: {scheme}')
@@ -1,6 +1,8 @@
 from typing_extensions import TypeVar, Generic
 from dataclasses import dataclass, field
+from itertools import islice
 from kv import KV, InexistentItem
+from kv._abc import key_range
 
 T = TypeVar('T')
 
@@ -18,14 +20,18 @@ class DictKV(KV[T], Generic[T]):
     else:
       raise InexistentItem(key)
   
+  async def has(self, key: str):
+    return key in self.xs
+
   async def delete(self, key: str):
     if key in self.xs:
       del self.xs[key]
     else:
       raise InexistentItem(key)
     
-  async def keys(self):
-    for key in self.xs.keys():
+  async def keys(self, *, prefix: str = '', start: str | None = None, end: str | None = None, limit: int | None = None):
+    matches = key_range(prefix, start, end)
+    for key in islice((k for k in list(self.xs) if matches(k)), limit):
       yield key
 
   async def items(self):
@@ -0,0 +1,177 @@
+from typing_extensions import AsyncIterable, TypeVar, Generic, overload, Sequence, Mapping, Iterable
+from dataclasses import dataclass
+import asyncio
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.exc import DatabaseError
+from kv import KV, KVError, InexistentItem
+from kv._abc import item_pairs
+from .sql import SQLStatements, define_table, pool_options, PAGE_SIZE
+
+T = TypeVar('T')
+U = TypeVar('U')
+
+@dataclass
+class AsyncSQLKV(SQLStatements, KV[T], Generic[T]):
+  """`KV` implementation over sqlalchemy's `AsyncEngine` (e.g. `aiosqlite`, `asyncpg`, `asyncmy`): queries never block the event loop,
+  and concurrent operations run on separate pooled connections. The table is created on first use
+  """
+
+  Type: type[T]
+  engine: AsyncEngine
+  table: str
+  prefix_: str = ''
+
+  def __post_init__(self):
+    self.Base, self.Table, self.parse, self.dump = define_table(self.Type, self.table, self.engine.dialect.name)
+    self.created = False
+    self.lock = asyncio.Lock()
+
+  @overload
+  @classmethod
+  def new(cls, conn_str: str, *, table: str, pool_size: int | None = None, max_overflow: int | None = None) -> 'AsyncSQLKV[bytes]':
+    ...
+  @overload
+  @classmethod
+  def new(cls, conn_str: str, type: type[U] | None = None, *, table: str, pool_size: int | None = None, max_overflow: int | None = None) -> 'AsyncSQLKV[U]':
+    ...
+  @classmethod
+  def new(cls, conn_str: str, type: type[U] | None = None, *, table: str, pool_size: int | None = None, max_overflow: int | None = None): # type: ignore
+    from sqlalchemy.ext.asyncio import create_async_engine
+    engine = create_async_engine(conn_str, **pool_options(pool_size, max_overflow))
+    return cls(type or bytes, engine, table=table) # type: ignore
+
+  def __repr__(self):
+    return f'AsyncSQLKV({self.engine.url!r}, table={self.table!r}, prefix={self.prefix_!r})'
+
+  async def create(self):
+    if self.created:
+      return
+    async with self.lock:
+      if not self.created:
+        async with self.engine.begin() as conn:
+          await conn.run_sync(self.Base.metadata.create_all)
+        self.created = True
+
+  async def delete(self, key: str):
+    try:
+      await self.create()
+      async with self.engine.begin() as conn:
+        result = await conn.execute(self.delete_one(key))
+    except DatabaseError as e:
+      raise KVError(e) from e
+    if result.rowcount == 0:
+      raise InexistentItem(key)
+
+  async def read(self, key: str) -> T:
+    try:
+      await self.create()
+      async with self.engine.connect() as conn:
+        row = (await conn.execute(self.read_one(key))).first()
+    except DatabaseError as e:
+      raise KVError(e) from e
+    if row is None:
+      raise InexistentItem(key)
+    return self.parse(row.value)
+
+  async def has(self, key: str) -> bool:
+    try:
+      await self.create()
+      async with self.engine.connect() as conn:
+        return (await conn.execute(self.has_one(key))).first() is not None
+    except DatabaseError as e:
+      raise KVError(e) from e
+
+  async def insert(self, key: str, value: T):
+    try:
+      await self.create()
+      async with self.engine.begin() as conn:
+        for stmt, params in self.write(self.rows([(key, value)])):
+          await conn.execute(stmt, params)
+    except DatabaseError as e:
+      raise KVError(e) from e
+
+  async def read_many(self, keys: Sequence[str], *, max_concurrent: int = 16) -> list[T | None]:
+    full_keys = self.full_keys(keys)
+    try:
+      await self.create()
+      async with self.engine.connect() as conn:
+        found = {}
+        for stmt in self.select_in(full_keys, 'key', 'value'):
+          for k, v in await conn.execute(stmt):
+            found[k] = self.parse(v)
+        return [found.get(key) for key in full_keys]
+    except DatabaseError as e:
+      raise KVError(e) from e
+
+  async def insert_many(self, items: Mapping[str, T] | Iterable[tuple[str, T]], *, max_concurrent: int = 16):
+    if not (rows := self.rows(item_pairs(items))):
+      return
+    try:
+      await self.create()
+      async with self.engine.begin() as conn:
+        for stmt, params in self.write(rows):
+          await conn.execute(stmt, params)
+    except DatabaseError as e:
+      raise KVError(e) from e
+
+  async def delete_many(self, keys: Sequence[str], *, max_concurrent: int = 16):
+    try:
+      await self.create()
+      async with self.engine.begin() as conn:
+        for stmt in self.delete_in(self.full_keys(keys)):
+          await conn.execute(stmt)
+    except DatabaseError as e:
+      raise KVError(e) from e
+
+  async def has_many(self, keys: Sequence[str], *, max_concurrent: int = 16) -> list[bool]:
+    full_keys = self.full_keys(keys)
+    try:
+      await self.create()
+      async with self.engine.connect() as conn:
+        found = set()
+        for stmt in self.select_in(full_keys, 'key'):
+          found.update((await conn.execute(stmt)).scalars())
+        return [key in found for key in full_keys]
+    except DatabaseError as e:
+      raise KVError(e) from e
+
+  async def keys(self, *, prefix: str = '', start: str | None = None, end: str | None = None, limit: int | None = None) -> AsyncIterable[str]:
+    """Keys in order, fetched in keyset-paginated queries of `PAGE_SIZE` (no connection is held while the caller consumes them)"""
+    where = self.where(prefix, start, end)
+    last = None
+    try:
+      await self.create()
+      while limit is None or limit > 0:
+        n = PAGE_SIZE if limit is None else min(PAGE_SIZE, limit)
+        async with self.engine.connect() as conn:
+          keys = (await conn.execute(self.keys_page(where, n, last))).scalars().all()
+        for key in keys:
+          yield key.removeprefix(self.prefix_)
+        if len(keys) < n:
+          return
+        if limit is not None:
+          limit -= n
+        last = keys[-1]
+    except DatabaseError as e:
+      raise KVError(e) from e
+
+  async def items(self) -> AsyncIterable[tuple[str, T]]:
+    try:
+      await self.create()
+      async with self.engine.connect() as conn:
+        result = await conn.stream(self.select_all())
+        async for key, value in result:
+          yield key.removeprefix(self.prefix_), self.parse(value)
+    except DatabaseError as e:
+      raise KVError(e) from e
+
+  async def clear(self):
+    try:
+      await self.create()
+      async with self.engine.begin() as conn:
+        await conn.execute(self.delete_all())
+    except DatabaseError as e:
+      raise KVError(e) from e
+
+  async def aclose(self):
+    await self.engine.dispose()
@@ -1,10 +1,12 @@
-from typing import TypeVar, Generic, Callable
-from dataclasses import dataclass
+from typing import TypeVar, Generic, Callable, AsyncIterable, Type, cast
+from dataclasses import dataclass, replace
 from datetime import datetime
 from kv import LocatableKV
-from kv.serialization import Parse, Dump, default, serializers
+from kv._abc import filter_keys
+from kv.serialization import Parse, Dump, Serializers, default, serializers
 from azure.storage.blob.aio import BlobServiceClient
 from .container import BlobContainerKV
+from .util import SharedClient, client_session
 
 T = TypeVar('T')
 U = TypeVar('U')
@@ -31,16 +33,26 @@ class BlobKV(LocatableKV[T], Generic[T]):
     return f'BlobKV(account={self.client().account_name})'
 
   @staticmethod
-  def new(client: Callable[[], BlobServiceClient], type: type[U] | None, *, split_key: Callable[[str], tuple[str, str]] = default_split) -> 'BlobKV[U]':
-    return (
-      BlobKV(client, split_key, **serializers(type))
-      if type and type is not bytes else BlobKV(client, split_key)
-    )
+  def new(
+    client: Callable[[], BlobServiceClient], type: type[U] | None, *, split_key: Callable[[str], tuple[str, str]] = default_split,
+    format: str = 'json', compression: str | None = None
+  ) -> 'BlobKV[U]':
+    return BlobKV(client, split_key, **serializers(cast(Type[U], type or bytes), format=format, compression=compression))
   
   @staticmethod
-  def from_conn_str(conn_str: str, type: type[T] | None = None, *, split_key: Callable[[str], tuple[str, str]] = default_split) -> 'BlobKV[T]':
+  def from_conn_str(
+    conn_str: str, type: type[T] | None = None, *, split_key: Callable[[str], tuple[str, str]] = default_split, pooled: bool = False,
+    format: str = 'json', compression: str | None = None
+  ) -> 'BlobKV[T]':
+    """- `pooled`: reuse a single long-lived client (and its connections) across calls and containers. Close it with `aclose()` or `async with`"""
     client = lambda: BlobServiceClient.from_connection_string(conn_str)
-    return BlobKV.new(client, type, split_key=split_key)
+    return BlobKV.new(SharedClient(client) if pooled else client, type, split_key=split_key, format=format, compression=compression)
+
+  def raw(self) -> 'BlobKV[bytes]':
+    return replace(self, parse=default.parse, dump=default.dump) # type: ignore
+
+  def raw_serializers(self):
+    return Serializers(parse=self.parse, dump=self.dump)
 
   def prefixed(self, prefix: str): # type: ignore
     return BlobContainerKV(
@@ -59,20 +71,36 @@ class BlobKV(LocatableKV[T], Generic[T]):
   def read(self, key: str):
     container, blob = self.split_key(key)
     return self.prefixed(container).read(blob)
+
+  def has(self, key: str):
+    container, blob = self.split_key(key)
+    return self.prefixed(container).has(blob)
+
+  def read_stream(self, key: str, **kwargs):
+    container, blob = self.split_key(key)
+    return self.prefixed(container).read_stream(blob, **kwargs)
+
+  def insert_stream(self, key: str, chunks: AsyncIterable[bytes], **kwargs):
+    container, blob = self.split_key(key)
+    return self.prefixed(container).insert_stream(blob, chunks, **kwargs)
   
   async def containers(self):
-    async with self.client() as client:
+    async with client_session(self.client) as client:
       async for c in client.list_containers():
         yield c.name or ''
   
-  async def container_keys(self, container: str):
-    async for key in self.prefixed(container).keys():
+  async def container_keys(self, container: str, *, prefix: str = ''):
+    async for key in self.prefixed(container).keys(prefix=prefix):
       yield self.merge_key(container, key)
 
-  async def keys(self):
-    async for container in self.containers():
-      async for key in self.container_keys(container):
-        yield key
+  async def keys(self, *, prefix: str = '', start: str | None = None, end: str | None = None, limit: int | None = None):
+    if '/' in prefix: # the prefix pins down the container: list only its matching blobs
+      container, blob_prefix = self.split_key(prefix)
+      keys = self.container_keys(container, prefix=blob_prefix)
+    else:
+      keys = (key async for container in self.containers() async for key in self.container_keys(container))
+    async for key in filter_keys(keys, prefix=prefix, start=start, end=end, limit=limit):
+      yield key
   
   async def items(self):
     async for container in self.containers():
@@ -86,4 +114,8 @@ class BlobKV(LocatableKV[T], Generic[T]):
 
   def url(self, key: str, *, expiry: datetime | None = None) -> str:
     container, blob = self.split_key(key)
-    return self.prefixed(container).url(blob, expiry=expiry)
\ No newline at end of file
+    return self.prefixed(container).url(blob, expiry=expiry)
+  
+  async def aclose(self):
+    if isinstance(self.client, SharedClient):
+      await self.client.aclose()
\ No newline at end of file
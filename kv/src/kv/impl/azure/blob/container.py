@@ -1,12 +1,19 @@
-from typing import TypeVar, Generic, Callable, ParamSpec, Awaitable, overload
-from dataclasses import dataclass
+from typing import TypeVar, Generic, Callable, ParamSpec, Awaitable, AsyncIterable, overload, Type, cast
+from dataclasses import dataclass, replace
 from contextlib import asynccontextmanager
+from collections import deque
+from base64 import b64encode
+import asyncio
+import uuid
 from datetime import datetime
+from azure.core import MatchConditions
 from azure.core.exceptions import ResourceNotFoundError
+from azure.storage.blob import BlobBlock
 from azure.storage.blob.aio import BlobServiceClient
 from kv import KVError, InexistentItem, LocatableKV
-from kv.serialization import Parse, Dump, default, serializers
-from .util import blob_url
+from kv.serialization import Parse, Dump, Serializers, default, serializers
+from kv._abc import CHUNK_SIZE
+from .util import blob_url, SharedClient, client_session, rechunk
 
 T = TypeVar('T')
 U = TypeVar('U')
@@ -36,20 +43,24 @@ class BlobContainerKV(LocatableKV[T], Generic[T]):
     return f'BlobContainerKV(account={self.client().account_name}, container={self.container})'
 
   @staticmethod
-  def new(client: Callable[[], BlobServiceClient], type: type[U] | None = None, *, container: str) -> 'BlobContainerKV[U]':
-    return (
-      BlobContainerKV(client, container, **serializers(type))
-      if type and type is not bytes else BlobContainerKV(client, container)
-    )
+  def new(
+    client: Callable[[], BlobServiceClient], type: type[U] | None = None, *, container: str,
+    format: str = 'json', compression: str | None = None
+  ) -> 'BlobContainerKV[U]':
+    return BlobContainerKV(client, container, **serializers(cast(Type[U], type or bytes), format=format, compression=compression))
 
   @staticmethod
-  def from_conn_str(conn_str: str, container: str, type: type[U] | None = None) -> 'BlobContainerKV[U]':
+  def from_conn_str(
+    conn_str: str, container: str, type: type[U] | None = None, *, pooled: bool = False,
+    format: str = 'json', compression: str | None = None
+  ) -> 'BlobContainerKV[U]':
+    """- `pooled`: reuse a single long-lived client (and its connections) across calls. Close it with `aclose()` or `async with`"""
     client = lambda: BlobServiceClient.from_connection_string(conn_str)
-    return BlobContainerKV.new(client, type, container=container)
+    return BlobContainerKV.new(SharedClient(client) if pooled else client, type, container=container, format=format, compression=compression)
 
   @asynccontextmanager
   async def container_manager(self):
-    async with self.client() as client:
+    async with client_session(self.client) as client:
       yield client.get_container_client(self.container)
 
   @azure_safe
@@ -67,6 +78,73 @@ class BlobContainerKV(LocatableKV[T], Generic[T]):
       data = self.dump(value)
       await client.upload_blob(key, data, overwrite=True)
 
+  async def read_stream(self, key: str, *, chunk_size: int = CHUNK_SIZE, max_concurrency: int = 4):
+    """Ranged downloads of `chunk_size` bytes, up to `max_concurrency` in flight (yielded in order).
+    Fails if the blob is modified midway, rather than mixing versions
+    """
+    pending: deque[asyncio.Task[bytes]] = deque()
+    try:
+      async with self.container_manager() as client:
+        blob = client.get_blob_client(key)
+        props = await blob.get_blob_properties()
+        size = props.size
+
+        async def download(offset: int) -> bytes:
+          r = await blob.download_blob(
+            offset=offset, length=min(chunk_size, size - offset),
+            etag=props.etag, match_condition=MatchConditions.IfNotModified,
+          )
+          return await r.readall()
+
+        offsets = iter(range(0, size, chunk_size))
+        for offset in offsets:
+          pending.append(asyncio.create_task(download(offset)))
+          if len(pending) >= max_concurrency:
+            break
+        while pending:
+          chunk = await pending.popleft()
+          if (offset := next(offsets, None)) is not None:
+            pending.append(asyncio.create_task(download(offset)))
+          yield chunk
+    except ResourceNotFoundError as e:
+      raise InexistentItem(key) from e
+    except Exception as e:
+      raise KVError(e) from e
+    finally:
+      for task in pending:
+        task.cancel()
+
+  @azure_safe
+  async def insert_stream(self, key: str, chunks: AsyncIterable[bytes], *, block_size: int = CHUNK_SIZE, max_concurrency: int = 4):
+    """Stages blocks of (at least) `block_size` bytes as chunks arrive, up to `max_concurrency` uploads in flight, then commits them at once"""
+    async with self.container_manager() as client:
+      if not await client.exists():
+        await client.create_container()
+      blob = client.get_blob_client(key)
+      upload_id = uuid.uuid4().hex # distinct block ids across concurrent uploads of the same key
+      block_ids: list[str] = []
+      tasks: list[asyncio.Task] = []
+      slots = asyncio.Semaphore(max_concurrency)
+
+      async def stage(block_id: str, data: bytes):
+        try:
+          await blob.stage_block(block_id, data)
+        finally:
+          slots.release()
+
+      try:
+        async for block in rechunk(chunks, block_size):
+          await slots.acquire()
+          block_id = b64encode(f'{upload_id}-{len(block_ids):08d}'.encode()).decode()
+          block_ids.append(block_id)
+          tasks.append(asyncio.create_task(stage(block_id, block)))
+        await asyncio.gather(*tasks)
+      except BaseException:
+        for task in tasks:
+          task.cancel()
+        raise
+      await blob.commit_block_list([BlobBlock(block_id=id) for id in block_ids])
+
   @azure_safe
   async def has(self, key: str):
     async with self.container_manager() as client:
@@ -79,16 +157,30 @@ class BlobContainerKV(LocatableKV[T], Generic[T]):
     async with self.container_manager() as client:
       await client.delete_blob(key)
   
-  async def keys(self):
+  async def keys(self, *, prefix: str = '', start: str | None = None, end: str | None = None, limit: int | None = None):
+    """Lists only blobs starting with `prefix` (`name_starts_with`). Blobs are listed in order, so listing stops at `end`"""
+    if limit is not None and limit <= 0:
+      return
     try:
       async with self.container_manager() as client:
         if not await client.exists():
           return
-        async for name in client.list_blob_names():
-          yield name
+        async for name in client.list_blob_names(name_starts_with=prefix or None):
+          if end is not None and name >= end:
+            return
+          if start is None or name >= start:
+            yield name
+            if limit is not None and (limit := limit - 1) == 0:
+              return
     except Exception as e:
       raise KVError(e) from e
 
+  def raw(self) -> 'BlobContainerKV[bytes]':
+    return replace(self, parse=default.parse, dump=default.dump) # type: ignore
+
+  def raw_serializers(self):
+    return Serializers(parse=self.parse, dump=self.dump)
+
   def url(self, key: str, *, expiry: datetime | None = None) -> str:
     bc = self.client().get_blob_client(self.container, key)
     return blob_url(bc, expiry=expiry)
@@ -96,4 +188,8 @@ class BlobContainerKV(LocatableKV[T], Generic[T]):
   @azure_safe
   async def clear(self):
     async with self.container_manager() as client:
-      await client.delete_container()
\ No newline at end of file
+      await client.delete_container()
+
+  async def aclose(self):
+    if isinstance(self.client, SharedClient):
+      await self.client.aclose()
\ No newline at end of file
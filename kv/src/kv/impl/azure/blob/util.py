@@ -1,5 +1,33 @@
+from typing import Callable, AsyncIterable
 from datetime import datetime, timedelta
+from contextlib import asynccontextmanager
 from azure.storage.blob import BlobSasPermissions, generate_blob_sas, BlobClient
+from azure.storage.blob.aio import BlobServiceClient
+
+class SharedClient:
+  """Long-lived `BlobServiceClient` (and its connection pool), created on first use and shared across KVs until `aclose`"""
+  def __init__(self, make: Callable[[], BlobServiceClient]):
+    self.make = make
+    self.client: BlobServiceClient | None = None
+
+  def __call__(self) -> BlobServiceClient:
+    if self.client is None:
+      self.client = self.make()
+    return self.client
+  
+  async def aclose(self):
+    if self.client is not None:
+      client, self.client = self.client, None
+      await client.close()
+
+@asynccontextmanager
+async def client_session(client: Callable[[], BlobServiceClient]):
+  """Yields the shared client if `client` is a `SharedClient`; otherwise a fresh client, closed on exit"""
+  if isinstance(client, SharedClient):
+    yield client()
+  else:
+    async with client() as c:
+      yield c
 
 def blob_url(
   client: BlobClient,
@@ -11,4 +39,16 @@ def blob_url(
   if expiry is None:
     expiry = datetime.now() + timedelta(days=int(1e6)) # aka never
   token = generate_blob_sas(account_name, client.container_name, client.blob_name, account_key=account_key, expiry=expiry, permission=permission)
-  return f"{client.url}?{token}"
\ No newline at end of file
+  return f"{client.url}?{token}"
+
+async def rechunk(chunks: AsyncIterable[bytes], size: int) -> AsyncIterable[bytes]:
+  """Regroup `chunks` into chunks of at least `size` bytes (except the last one)"""
+  buf, n = [], 0
+  async for chunk in chunks:
+    buf.append(chunk)
+    n += len(chunk)
+    if n >= size:
+      yield b''.join(buf)
+      buf, n = [], 0
+  if buf:
+    yield b''.join(buf)
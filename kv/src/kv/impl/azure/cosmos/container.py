@@ -3,6 +3,7 @@ from dataclasses import dataclass
 from azure.cosmos.aio import CosmosClient
 from azure.cosmos.exceptions import CosmosResourceNotFoundError
 from kv import KV, KVError
+from kv._abc import filter_keys
 from .util import ContainerMixin, azure_safe, decode, serializers, default_split, default_merge
 from .partition import CosmosPartitionKV
 
@@ -64,7 +65,7 @@ class CosmosContainerKV(KV[T], ContainerMixin[T], Generic[T]):
   def key(self, item: dict):
     return self.merge_key(item['partition'], decode(item['id']))
   
-  async def keys(self):
+  async def all_keys(self):
     try:
       async with self.container_manager() as cc:
         query = 'SELECT c.id, c.partition FROM c'
@@ -75,6 +76,19 @@ class CosmosContainerKV(KV[T], ContainerMixin[T], Generic[T]):
     except Exception as e:
       raise KVError(e) from e
 
+  async def partition_keys(self, partition: str, *, prefix: str = ''):
+    async for key in self.prefixed(partition).keys(prefix=prefix):
+      yield self.merge_key(partition, key)
+
+  async def keys(self, *, prefix: str = '', start: str | None = None, end: str | None = None, limit: int | None = None):
+    if '/' in prefix: # the prefix pins down the partition: query only its matching items
+      partition, item_prefix = self.split_key(prefix)
+      keys = self.partition_keys(partition, prefix=item_prefix)
+    else:
+      keys = self.all_keys()
+    async for key in filter_keys(keys, prefix=prefix, start=start, end=end, limit=limit):
+      yield key
+
   async def items(self):
     try:
       async with self.container_manager() as cc:
@@ -3,6 +3,7 @@ from dataclasses import dataclass
 from azure.cosmos.aio import CosmosClient
 from azure.cosmos.exceptions import CosmosResourceNotFoundError
 from kv import KV, KVError
+from kv._abc import filter_keys
 from .util import DatabaseMixin, default_split, default_merge, serializers, azure_safe
 from .container import CosmosContainerKV
 
@@ -61,7 +62,20 @@ class CosmosKV(KV[T], DatabaseMixin[T], Generic[T]):
     partition, item = self.split_key(key)
     return self.prefixed(partition).delete(item)
   
-  async def keys(self):
+  async def container_keys(self, container: str, *, prefix: str = ''):
+    async for key in self.prefixed(container).keys(prefix=prefix):
+      yield self.merge_key(container, key)
+
+  async def keys(self, *, prefix: str = '', start: str | None = None, end: str | None = None, limit: int | None = None):
+    if '/' in prefix: # the prefix pins down the container
+      container, item_prefix = self.split_key(prefix)
+      keys = self.container_keys(container, prefix=item_prefix)
+    else:
+      keys = self.all_keys()
+    async for key in filter_keys(keys, prefix=prefix, start=start, end=end, limit=limit):
+      yield key
+
+  async def all_keys(self):
     try:
       async with self.database_manager() as dc:
         async for c in dc.list_containers():
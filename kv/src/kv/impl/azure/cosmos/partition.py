@@ -72,11 +72,21 @@ class CosmosPartitionKV(KV[T], ContainerMixin[T], Generic[T]):
       ...
     return False
 
-  async def keys(self):
+  async def keys(self, *, prefix: str = '', start: str | None = None, end: str | None = None, limit: int | None = None):
     try:
       async with self.container_manager() as cc:
-        query = 'SELECT c["key"] FROM c WHERE STARTSWITH(c["key"], @prefix)'
-        params: list[dict] = [{'name': '@prefix', 'value': self.prefix_}]
+        conds = ['STARTSWITH(c["key"], @prefix)']
+        params: list[dict] = [{'name': '@prefix', 'value': self.prefix_ + prefix}]
+        if start is not None:
+          conds.append('c["key"] >= @start')
+          params.append({'name': '@start', 'value': self.prefix_ + start})
+        if end is not None:
+          conds.append('c["key"] < @end')
+          params.append({'name': '@end', 'value': self.prefix_ + end})
+        query = f'SELECT c["key"] FROM c WHERE {" AND ".join(conds)}'
+        if limit is not None:
+          query = f'SELECT TOP @limit c["key"] FROM c WHERE {" AND ".join(conds)} ORDER BY c["key"]'
+          params.append({'name': '@limit', 'value': limit})
         async for item in cc.query_items(query=query, parameters=params, partition_key=self.partition_key):
           yield item['key'].removeprefix(self.prefix_)
     except CosmosResourceNotFoundError:
@@ -22,15 +22,15 @@ class Serializers(TypedDict, Generic[T]):
   dump: Callable[[T], dict|list|str]
 
 def serializers(type: type[T]) -> Serializers[T]:
-  from pydantic import RootModel, ValidationError
-  Type = RootModel[type]
+  from pydantic import TypeAdapter, ValidationError
+  Type = TypeAdapter(type)
   def parse(x):
     try:
-      return Type.model_validate(x).root
+      return Type.validate_python(x)
     except ValidationError as e:
       raise InvalidData from e
   def dump(x):
-    return Type(x).model_dump()
+    return Type.dump_python(x)
   return Serializers(parse=parse, dump=dump)
 
 def default_split(key: str) -> tuple[str, str]:
@@ -1,13 +1,20 @@
-from typing_extensions import TypeVar, Generic, ParamSpec, overload, Iterable, Callable, Coroutine
-from functools import wraps
-from dataclasses import dataclass
+from typing_extensions import TypeVar, Generic, ParamSpec, overload, Iterable, AsyncIterable, AsyncIterator, Callable, Coroutine, Any, Literal
+from functools import update_wrapper
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, replace, field
+from concurrent.futures import Executor
 import os
+import mmap
+import uuid
+import asyncio
 from kv import KV, KVError, InexistentItem
-from kv.serialization import Parse, Dump, default, serializers
+from kv.serialization import Parse, Dump, Serializers, default, serializers
+from kv._abc import key_range, CHUNK_SIZE
 
 T = TypeVar('T')
 U = TypeVar('U')
 L = TypeVar('L')
+R = TypeVar('R')
 Ps = ParamSpec('Ps')
 
 def ensure_path(file: str):
@@ -18,15 +25,167 @@ def ensure_path(file: str):
   if dir != '':
     os.makedirs(dir, exist_ok=True)
 
+TMP_SUFFIX = '.kv-tmp'
+"""Suffix of in-progress writes (ignored when listing keys)"""
+
 def rec_paths(base_path: str) -> Iterable[str]:
   """Returns all files inside `base_path`, recursively, relative to `base_path`"""
   for root, _, files in os.walk(base_path):
     for file in files:
-      path = os.path.join(root, file)
-      yield os.path.relpath(path, start=base_path)
+      if not file.endswith(TMP_SUFFIX):
+        path = os.path.join(root, file)
+        yield os.path.relpath(path, start=base_path)
+
+def fsync_path(path: str):
+  """`fsync` a file or directory by path"""
+  fd = os.open(path, os.O_RDONLY)
+  try:
+    os.fsync(fd)
+  finally:
+    os.close(fd)
+
+def open_tmp(path: str):
+  """Open a fresh temporary file next to `path`, for writing"""
+  ensure_path(path)
+  tmp = f'{path}.{uuid.uuid4().hex[:12]}{TMP_SUFFIX}'
+  return open(tmp, 'xb'), tmp
+
+def write_tmp(path: str, data: bytes, fsync: bool = False) -> str:
+  """Write `data` to a fresh temporary file next to `path`. Returns the temporary path"""
+  f, tmp = open_tmp(path)
+  try:
+    with f:
+      f.write(data)
+      if fsync:
+        f.flush()
+        os.fsync(f.fileno())
+  except:
+    discard(tmp)
+    raise
+  return tmp
+
+def discard(tmp: str):
+  try:
+    os.remove(tmp)
+  except OSError:
+    ...
+
+def write_file(path: str, data: bytes, fsync: bool = False):
+  """Atomically write `data` to `path`: readers see either the old or the new contents, never a partial write.
+  - `fsync`: also make the write durable before returning
+  """
+  tmp = write_tmp(path, data, fsync)
+  try:
+    os.replace(tmp, path)
+  except:
+    discard(tmp)
+    raise
+  if fsync:
+    fsync_path(os.path.dirname(path) or '.')
+
+def commit_batch(writes: list[tuple[str, str]]) -> list[OSError | None]:
+  """Durably rename a batch of `(tmp, path)` writes: `fsync` each file, rename it, then `fsync` each directory once per batch.
+  Returns each write's error (`None` if committed)"""
+  errors: list[OSError | None] = [None] * len(writes)
+  for i, (tmp, path) in enumerate(writes):
+    try:
+      fsync_path(tmp)
+      os.replace(tmp, path)
+    except OSError as e:
+      errors[i] = e
+  dirs: dict[str, list[int]] = {}
+  for i, (_, path) in enumerate(writes):
+    if errors[i] is None:
+      dirs.setdefault(os.path.dirname(path) or '.', []).append(i)
+  for dir, idxs in dirs.items():
+    try:
+      fsync_path(dir)
+    except OSError as e: # the renames may not be durable
+      for i in idxs:
+        errors[i] = e
+  for (tmp, _), err in zip(writes, errors):
+    if err is not None:
+      discard(tmp)
+  return errors
+
+def map_file(path: str) -> mmap.mmap | None:
+  """Read-only memory map of the whole file (`None` if it's empty, which can't be mapped)"""
+  with open(path, 'rb') as f:
+    if os.fstat(f.fileno()).st_size == 0:
+      return None
+    return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) # stays valid after closing the file
 
-def wrap_exceptions(f: Callable[Ps, Coroutine[None, None, T]]) -> Callable[Ps, Coroutine[None, None, T]]:
-  @wraps(f)
+def read_file(path: str) -> bytes:
+  with open(path, 'rb') as f:
+    return f.read()
+  
+def remove_file(path: str):
+  os.remove(path)
+  try: # clean up empty directories
+    os.removedirs(os.path.dirname(path))
+  except:
+    ...
+
+def copy_file(src: str, dst: str):
+  import shutil
+  ensure_path(dst)
+  tmp = f'{dst}.{uuid.uuid4().hex[:12]}{TMP_SUFFIX}'
+  try:
+    shutil.copy(src, tmp)
+    os.replace(tmp, dst)
+  except:
+    discard(tmp)
+    raise
+
+def move_file(src: str, dst: str):
+  import shutil
+  ensure_path(dst)
+  shutil.move(src, dst)
+
+def clear_dir(path: str):
+  import shutil
+  shutil.rmtree(path)
+  os.makedirs(path)
+
+class GroupCommit:
+  """Group commit: concurrent writes arriving within `delay` seconds are made durable together, in one `commit_batch` run in `executor` (off the event loop)"""
+  def __init__(self, executor: Executor | None, delay: float):
+    self.executor = executor
+    self.delay = delay
+    self.pending: list[tuple[str, str, asyncio.Future[None]]] = []
+    self.scheduled = False
+    self.tasks: set[asyncio.Task] = set()
+    """Running flushes (referenced, so they aren't garbage-collected midway)"""
+
+  async def commit(self, tmp: str, path: str):
+    fut = asyncio.get_running_loop().create_future()
+    self.pending.append((tmp, path, fut))
+    if not self.scheduled:
+      self.scheduled = True
+      task = asyncio.create_task(self.flush())
+      self.tasks.add(task)
+      task.add_done_callback(self.tasks.discard)
+    await fut
+
+  async def flush(self):
+    """Commit the pending batch, settling each write's future with its own outcome"""
+    await asyncio.sleep(self.delay)
+    batch, self.pending = self.pending, []
+    self.scheduled = False
+    try:
+      writes = [(tmp, path) for tmp, path, _ in batch]
+      errors = await asyncio.get_running_loop().run_in_executor(self.executor, commit_batch, writes)
+    except BaseException as e:
+      errors = [e] * len(batch)
+    for (*_, fut), e in zip(batch, errors):
+      if fut.done(): # cancelled by the writer
+        continue
+      if e is None:
+        fut.set_result(None)
+      else:
+        fut.set_exception(e)
+
+def wrap_exceptions(f: Callable[Ps, Coroutine[Any, Any, T]]):
   async def wrapper(*args: Ps.args, **kwargs: Ps.kwargs) -> T:
     try:
       return await f(*args, **kwargs)
@@ -34,34 +193,59 @@ def wrap_exceptions(f: Callable[Ps, Coroutine[None, None, T]]) -> Callable[Ps, C
       raise InexistentItem(str(e)) from e
     except OSError as e:
       raise KVError(str(e)) from e
+  update_wrapper(wrapper, f)
   return wrapper
 
 @dataclass
 class FilesystemKV(KV[T], Generic[T]):
-  """Filesystem-based `KV` implementation"""
+  """Filesystem-based `KV` implementation
+  - `offload`: run blocking file I/O in `executor` (defaults to the event loop's thread pool), so that concurrent operations don't stall the event loop
+  - `fsync`: durability of writes (which are always atomic: temp file + rename):
+    - `'never'`: rely on the OS to flush (fastest; a crash may lose recent writes, but never corrupts them)
+    - `'always'`: fsync every write before returning
+    - `'batch'`: group commit. Concurrent writes within `fsync_delay` seconds are flushed together
+  """
 
   base_path: str
   extension: str = ''
   parse: Parse[T] = default[T].parse
   dump: Dump[T] = default[T].dump
+  offload: bool = False
+  executor: Executor | None = None
+  fsync: Literal['never', 'always', 'batch'] = 'never'
+  fsync_delay: float = 0.001
+  group_commit: GroupCommit = field(init=False, repr=False)
 
   @classmethod
   @overload
-  def new(cls, base_path: str) -> 'FilesystemKV[bytes]':
+  def new(
+    cls, base_path: str, *, offload: bool = False, executor: Executor | None = None,
+    fsync: Literal['never', 'always', 'batch'] = 'never', compression: str | None = None
+  ) -> 'FilesystemKV[bytes]':
     ...
   @classmethod
   @overload
-  def new(cls, base_path: str, type: type[U] | None = None) -> 'FilesystemKV[U]':
+  def new(
+    cls, base_path: str, type: type[U] | None = None, *, offload: bool = False, executor: Executor | None = None,
+    fsync: Literal['never', 'always', 'batch'] = 'never', format: str = 'json', compression: str | None = None
+  ) -> 'FilesystemKV[U]':
     ...
   @classmethod
-  def new(cls, base_path: str, type: type[T] | None = None):
-    if type and type is not bytes:
-      return FilesystemKV(base_path, extension='.json', **serializers(type))
-    else:
-      return FilesystemKV(base_path)
+  def new(
+    cls, base_path: str, type: type | None = None, *, offload: bool = False, executor: Executor | None = None,
+    fsync: Literal['never', 'always', 'batch'] = 'never', format: str = 'json', compression: str | None = None
+  ) -> 'FilesystemKV[Any]':
+    """- `format`, `compression`: see `kv.serializers`. Files get matching extensions (e.g. `.json`, `.msgpack.zstd`)"""
+    Type = type or bytes
+    extension = ('' if Type is bytes else '.' + format) + ('.' + compression if compression else '')
+    return FilesystemKV(
+      base_path, extension=extension, **serializers(Type, format=format, compression=compression),
+      offload=offload, executor=executor, fsync=fsync
+    )
 
   def __post_init__(self):
     os.makedirs(self.base_path, exist_ok=True)
+    self.group_commit = GroupCommit(self.executor, self.fsync_delay)
 
   def __repr__(self):
     return f'FilesystemKV(base_path={self.base_path!r}, extension={self.extension!r})'
@@ -72,52 +256,154 @@ class FilesystemKV(KV[T], Generic[T]):
   def key(self, path: str):
     return path.removesuffix(self.extension)
   
+  async def run(self, f: Callable[..., R], *args: Any) -> R:
+    """Run the blocking `f(*args)`, in `executor` if `offload`"""
+    if not self.offload:
+      return f(*args)
+    return await asyncio.get_running_loop().run_in_executor(self.executor, f, *args)
+  
   @wrap_exceptions
   async def insert(self, key: str, value: T):
-    ensure_path(self.path(key))
-    with open(self.path(key), 'wb') as f:
-      f.write(self.dump(value))
+    data = self.dump(value)
+    if self.fsync == 'batch':
+      tmp = await self.run(write_tmp, self.path(key), data)
+      await self.group_commit.commit(tmp, self.path(key))
+    else:
+      await self.run(write_file, self.path(key), data, self.fsync == 'always')
 
   @wrap_exceptions
   async def read(self, key: str):
-    with open(self.path(key), 'rb') as f:
-      return self.parse(f.read())
+    return self.parse(await self.run(read_file, self.path(key)))
     
   @wrap_exceptions
   async def delete(self, key: str):
-    os.remove(self.path(key))
-    try: # clean up empty directories
-      os.removedirs(os.path.dirname(self.path(key)))
-    except:
-      ...
+    await self.run(remove_file, self.path(key))
   
   async def has(self, key: str):
-    return os.path.exists(self.path(key))
+    return await self.run(os.path.exists, self.path(key))
   
-  async def keys(self):
-    for name in rec_paths(self.base_path):
-      yield self.key(name)
+  @asynccontextmanager
+  async def mapped(self, key: str) -> AsyncIterator[T]:
+    """Read item `key` by memory-mapping its file, without copying it into memory first:
+    yields `parse(buf)`, where `buf` is a read-only `memoryview` of the file. For `bytes` stores, that's `buf` itself.
+    Pages are loaded lazily by the OS as they're accessed (and can be evicted), so only the touched parts take up memory.
+
+    The buffer is only valid within the `async with` block: it's released on exit, after which using it raises `ValueError`.
+    Copy what needs to outlive the block (e.g. `bytes(buf[a:b])`). Objects still holding the buffer on exit (e.g. `np.frombuffer(buf)`)
+    keep the mapping open until they're garbage collected. The file may be replaced meanwhile (writes are atomic renames), but the
+    mapping keeps seeing the version it opened.
+
+    ```
+    async with kv.mapped('features/x.bin') as buf:
+      header = bytes(buf[:16])
+      arr = np.frombuffer(buf, dtype=np.float32, offset=16).sum()
+    ```
+    """
+    try:
+      mm = await self.run(map_file, self.path(key))
+    except FileNotFoundError as e:
+      raise InexistentItem(key) from e
+    except OSError as e:
+      raise KVError(str(e)) from e
+    buf = memoryview(b'' if mm is None else mm)
+    try:
+      yield self.parse(buf) # type: ignore
+    finally:
+      try:
+        buf.release()
+        if mm is not None:
+          mm.close()
+      except BufferError: # still exported: the mapping is closed once the exporters are collected
+        ...
+
+  async def read_stream(self, key: str, *, chunk_size: int = CHUNK_SIZE) -> AsyncIterable[bytes]:
+    """Reads the file `chunk_size` bytes at a time"""
+    path = self.path(key)
+    try:
+      f = await self.run(lambda: open(path, 'rb'))
+    except FileNotFoundError as e:
+      raise InexistentItem(key) from e
+    except OSError as e:
+      raise KVError(str(e)) from e
+    try:
+      while chunk := await self.run(f.read, chunk_size):
+        yield chunk
+    except OSError as e:
+      raise KVError(str(e)) from e
+    finally:
+      f.close()
+
+  @wrap_exceptions
+  async def insert_stream(self, key: str, chunks: AsyncIterable[bytes]):
+    """Writes chunks to a temporary file as they arrive, which then atomically replaces the item (honoring `fsync`)"""
+    path = self.path(key)
+    f, tmp = await self.run(open_tmp, path)
+    try:
+      with f:
+        async for chunk in chunks:
+          await self.run(f.write, chunk)
+        if self.fsync == 'always':
+          await self.run(f.flush)
+          await self.run(os.fsync, f.fileno())
+    except BaseException:
+      discard(tmp)
+      raise
+    if self.fsync == 'batch':
+      await self.group_commit.commit(tmp, path)
+    else:
+      try:
+        await self.run(os.replace, tmp, path)
+      except:
+        discard(tmp)
+        raise
+      if self.fsync == 'always':
+        await self.run(fsync_path, os.path.dirname(path) or '.')
+
+  async def keys(self, *, prefix: str = '', start: str | None = None, end: str | None = None, limit: int | None = None):
+    """Walks only the subtree under `prefix` (e.g. `prefix='a/b'` walks `a/`, descending only into entries starting with `b`)"""
+    if limit is not None and limit <= 0:
+      return
+    matches = key_range(prefix, start, end)
+    base = os.path.normpath(self.base_path)
+    top = os.path.normpath(os.path.join(base, os.path.dirname(prefix)))
+    if top != base and not top.startswith(base + os.sep):
+      raise KVError(f'Prefix {prefix!r} escapes the base path')
+    name_prefix = os.path.basename(prefix)
+    walk = os.walk(top)
+    def next_dir() -> tuple[str, list[str], list[str]] | None:
+      return next(walk, None)
+    while (step := await self.run(next_dir)) is not None: # one directory per step
+      root, dirs, files = step
+      if root == top:
+        dirs[:] = [d for d in dirs if d.startswith(name_prefix)]
+      for file in files:
+        if not file.endswith(TMP_SUFFIX):
+          key = self.key(os.path.relpath(os.path.join(root, file), start=self.base_path))
+          if matches(key):
+            yield key
+            if limit is not None and (limit := limit - 1) == 0:
+              return
 
   async def copy(self, key: str, to: 'KV[T]', to_key: str):
     if not isinstance(to, FilesystemKV):
       return await super().copy(key, to, to_key)
-    import shutil
-    ensure_path(to.path(to_key))
-    shutil.copy(self.path(key), to.path(to_key))
+    await self.run(copy_file, self.path(key), to.path(to_key))
   
   async def move(self, key: str, to: 'KV[T]', to_key: str):
     if not isinstance(to, FilesystemKV):
       return await super().move(key, to, to_key)
-    import shutil
-    ensure_path(to.path(to_key))
-    shutil.move(self.path(key), to.path(to_key))
+    await self.run(move_file, self.path(key), to.path(to_key))
 
   @wrap_exceptions
   async def clear(self):
-    import shutil
-    shutil.rmtree(self.base_path)
-    os.makedirs(self.base_path)
+    await self.run(clear_dir, self.base_path)
     
+  def raw(self) -> 'FilesystemKV[bytes]':
+    return replace(self, parse=default.parse, dump=default.dump) # type: ignore
+
+  def raw_serializers(self):
+    return Serializers(parse=self.parse, dump=self.dump)
+
   def prefixed(self, prefix: str) -> 'FilesystemKV[T]':
     new_base = os.path.join(self.base_path, prefix)
-    return FilesystemKV(new_base, self.extension, self.parse, self.dump)
\ No newline at end of file
+    return replace(self, base_path=new_base)
\ No newline at end of file
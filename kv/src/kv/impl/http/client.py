@@ -1,11 +1,14 @@
-from typing_extensions import TypeVar, Generic, Literal, AsyncIterable
-from dataclasses import dataclass
+from typing_extensions import TypeVar, Generic, Literal, AsyncIterable, Any, Sequence, Mapping, Iterable
+from dataclasses import dataclass, field, replace
 from datetime import datetime, timedelta
 from urllib.parse import quote
+import json
+from base64 import b64encode, b64decode
 import jwt
 import httpx
 from kv import KV, LocatableKV, KVError, InexistentItem
-from ...serialization import Parse, Dump, default, serializers
+from ...serialization import Parse, Dump, Serializers, default, serializers
+from ..._abc import filter_keys, item_pairs, CHUNK_SIZE
 
 T = TypeVar('T')
 U = TypeVar('U', default=bytes)
@@ -14,34 +17,138 @@ def sign_token(secret: str, expiry: datetime | None = None) -> str:
   payload = {} if expiry is None else {'exp': expiry.timestamp()}
   return jwt.encode(payload, secret, algorithm='HS256')
 
+def route_missing(r: httpx.Response) -> bool:
+  """Is `r` FastAPI's 404 for an unknown route (i.e. the server predates the endpoint), rather than an inexistent item?"""
+  if r.status_code != 404 or not r.headers.get('content-type', '').startswith('application/json'):
+    return False
+  try:
+    return r.json() == {'detail': 'Not Found'}
+  except ValueError:
+    return False
+
+class RouteMissing(KVError):
+  """The server predates the requested endpoint (see `route_missing`)"""
+
+class Session:
+  """Long-lived, pooled `httpx.AsyncClient` (created on first use) and cached auth token, shared by a `ClientKV` and its prefixed views"""
+  def __init__(
+    self, *, http2: bool = False, limits: httpx.Limits = httpx.Limits(max_connections=100, max_keepalive_connections=20),
+    timeout: httpx.Timeout | float = 5.0, token_ttl: timedelta = timedelta(minutes=5), token_margin: timedelta = timedelta(seconds=30),
+  ):
+    """
+    - `http2`: enable HTTP/2 (requires `httpx[http2]`)
+    - `limits`, `timeout`: passed to `httpx.AsyncClient`
+    - `token_ttl`: expiry of signed tokens. Tokens are reused until `token_margin` before they expire
+    """
+    self.http2 = http2
+    self.limits = limits
+    self.timeout = timeout
+    self.token_ttl = token_ttl
+    self.token_margin = token_margin
+    self._client: httpx.AsyncClient | None = None
+    self._loop = None
+    self._token: tuple[str, datetime] | None = None
+    self._closing: set = set()
+
+  def client(self) -> httpx.AsyncClient:
+    import asyncio
+    loop = asyncio.get_running_loop()
+    if self._client is None or self._loop is not loop: # connections can't outlive their event loop
+      if self._client is not None:
+        self._discard(self._client, self._loop)
+      self._client = httpx.AsyncClient(http2=self.http2, limits=self.limits, timeout=self.timeout)
+      self._loop = loop
+    return self._client
+
+  def _discard(self, client: httpx.AsyncClient, loop):
+    """Close `client`, left behind by a previous event loop: on that loop if it's still running, otherwise (best effort) on the current one"""
+    import asyncio
+    async def close():
+      try:
+        await client.aclose()
+      except Exception:
+        ...
+    if loop is not None and loop.is_running(): # e.g. a loop in another thread
+      loop.call_soon_threadsafe(lambda: loop.create_task(close()))
+    else:
+      task = asyncio.get_running_loop().create_task(close())
+      self._closing.add(task)
+      task.add_done_callback(self._closing.discard)
+  
+  def token(self, secret: str) -> str:
+    now = datetime.now()
+    if self._token is None or self._token[1] - self.token_margin <= now:
+      expiry = now + self.token_ttl
+      self._token = sign_token(secret, expiry), expiry
+    return self._token[0]
+  
+  async def aclose(self):
+    if self._client is not None:
+      client, self._client = self._client, None
+      await client.aclose()
+
 @dataclass
 class ClientKV(LocatableKV[T], Generic[T]):
-  """HTTP-based client `KV` implementation"""
+  """HTTP-based client `KV` implementation. Connections are pooled and kept alive until `aclose()`"""
   endpoint: str
   parse: Parse[T] = default[T].parse
   dump: Dump[T] = default[T].dump
   secret: str | None = None
   prefix_: str = ''
+  session: Session = field(default_factory=Session, repr=False)
 
   @classmethod
-  def new(cls, endpoint: str, type: type[U], *, secret: str | None = None) -> 'ClientKV[U]':
+  def new(
+    cls, endpoint: str, type: type[U], *, secret: str | None = None, http2: bool = False,
+    limits: httpx.Limits | None = None, timeout: httpx.Timeout | float | None = None,
+  ) -> 'ClientKV[U]':
+    opts = {}
+    if limits is not None:
+      opts['limits'] = limits
+    if timeout is not None:
+      opts['timeout'] = timeout
+    session = Session(http2=http2, **opts)
     return (
-      ClientKV(endpoint, **serializers(type), secret=secret)
-      if type is not bytes else ClientKV(endpoint, secret=secret)
+      ClientKV(endpoint, **serializers(type), secret=secret, session=session)
+      if type is not bytes else ClientKV(endpoint, secret=secret, session=session)
     )
     
   def __repr__(self):
     return f'ClientKV({self.endpoint}, prefix={self.prefix_})'
   
-  async def _req(self, method: Literal['GET', 'POST', 'DELETE'], path: str, *, data: bytes | str | None = None):
-    async with httpx.AsyncClient() as client:
-      endpoint = f'{self.endpoint.rstrip("/")}/{path.lstrip("/")}'
-      params = {}
-      if self.prefix_:
-        params['prefix'] = self.prefix_
-      if self.secret:
-        params['token'] = sign_token(self.secret, datetime.now() + timedelta(minutes=5))
-      return await client.request(method, endpoint, data=data, params=params) # type: ignore
+  def _params(self) -> dict[str, str]:
+    params = {}
+    if self.prefix_:
+      params['prefix'] = self.prefix_
+    if self.secret:
+      params['token'] = self.session.token(self.secret)
+    return params
+
+  async def _req(self, method: Literal['GET', 'POST', 'DELETE'], path: str, *, data: bytes | str | AsyncIterable[bytes] | None = None, json: Any = None):
+    endpoint = f'{self.endpoint.rstrip("/")}/{path.lstrip("/")}'
+    try:
+      return await self.session.client().request(method, endpoint, content=data, json=json, params=self._params())
+    except httpx.HTTPError as e:
+      raise KVError(str(e)) from e
+    
+  async def _stream(self, path: str, params: dict[str, Any] | None = None) -> AsyncIterable[Any]:
+    """Incrementally parse an NDJSON response (or a plain JSON array, from older servers)"""
+    endpoint = f'{self.endpoint.rstrip("/")}/{path.lstrip("/")}'
+    try:
+      async with self.session.client().stream('GET', endpoint, params=self._params() | (params or {})) as r:
+        if r.status_code != 200:
+          await r.aread()
+          raise RouteMissing(r.text) if route_missing(r) else KVError(r.text)
+        if r.headers.get('content-type', '').startswith('application/json'):
+          await r.aread()
+          for x in r.json():
+            yield x
+          return
+        async for line in r.aiter_lines():
+          if line:
+            yield json.loads(line)
+    except httpx.HTTPError as e:
+      raise KVError(str(e)) from e
   
   async def read(self, key: str) -> T:
     r = await self._req('GET', f'/item/{quote(key)}')
@@ -56,6 +163,26 @@ class ClientKV(LocatableKV[T], Generic[T]):
     if r.status_code != 200:
       raise KVError(r.text)
     
+  async def read_stream(self, key: str, *, chunk_size: int = CHUNK_SIZE) -> AsyncIterable[bytes]:
+    endpoint = f'{self.endpoint.rstrip("/")}/stream/{quote(key)}'
+    try:
+      async with self.session.client().stream('GET', endpoint, params=self._params() | {'chunk_size': chunk_size}) as r:
+        if r.status_code == 404:
+          raise InexistentItem(key)
+        if r.status_code != 200:
+          await r.aread()
+          raise KVError(r.text)
+        async for chunk in r.aiter_bytes(chunk_size):
+          yield chunk
+    except httpx.HTTPError as e:
+      raise KVError(str(e)) from e
+
+  async def insert_stream(self, key: str, chunks: AsyncIterable[bytes]):
+    """Uploads `chunks` as a streamed (chunked) request body"""
+    r = await self._req('POST', f'/stream/{quote(key)}', data=chunks)
+    if r.status_code != 200:
+      raise KVError(r.text)
+
   async def delete(self, key: str):
     r = await self._req('DELETE', f'/item/{quote(key)}')
     if r.status_code == 404:
@@ -64,16 +191,59 @@ class ClientKV(LocatableKV[T], Generic[T]):
       raise KVError(r.text)
     
   async def has(self, key: str) -> bool:
-    r = await self._req('GET', f'/item/{quote(key)}/has')
-    return r.json()
+    r = await self._req('GET', f'/has/{quote(key)}')
+    if route_missing(r): # older server: list the key instead
+      return await super().has(key)
+    if r.status_code not in (200, 404):
+      raise KVError(r.text)
+    return r.status_code == 200
   
-  async def keys(self) -> AsyncIterable[str]:
-    r = await self._req('GET', '/keys')
+  async def read_many(self, keys: Sequence[str], *, max_concurrent: int = 16) -> list[T | None]:
+    r = await self._req('POST', '/batch/read', json=list(keys))
+    if route_missing(r): # older server: read key by key
+      return await super().read_many(keys, max_concurrent=max_concurrent)
     if r.status_code != 200:
       raise KVError(r.text)
-    for key in r.json():
+    return [None if x is None else self.parse(b64decode(x)) for x in r.json()]
+  
+  async def insert_many(self, items: Mapping[str, T] | Iterable[tuple[str, T]], *, max_concurrent: int = 16):
+    pairs = list(item_pairs(items))
+    body = {k: b64encode(self.dump(v)).decode() for k, v in pairs}
+    r = await self._req('POST', '/batch/insert', json=body)
+    if route_missing(r): # older server
+      return await super().insert_many(pairs, max_concurrent=max_concurrent)
+    if r.status_code != 200:
+      raise KVError(r.text)
+    
+  async def delete_many(self, keys: Sequence[str], *, max_concurrent: int = 16):
+    r = await self._req('POST', '/batch/delete', json=list(keys))
+    if route_missing(r): # older server
+      return await super().delete_many(keys, max_concurrent=max_concurrent)
+    if r.status_code != 200:
+      raise KVError(r.text)
+    
+  async def has_many(self, keys: Sequence[str], *, max_concurrent: int = 16) -> list[bool]:
+    r = await self._req('POST', '/batch/has', json=list(keys))
+    if route_missing(r): # older server
+      return await super().has_many(keys, max_concurrent=max_concurrent)
+    if r.status_code != 200:
+      raise KVError(r.text)
+    return r.json()
+  
+  async def keys(self, *, prefix: str = '', start: str | None = None, end: str | None = None, limit: int | None = None) -> AsyncIterable[str]:
+    filters = dict(key_prefix=prefix or None, start=start, end=end, limit=limit)
+    keys = self._stream('/keys', {k: v for k, v in filters.items() if v is not None})
+    async for key in filter_keys(keys, prefix=prefix, start=start, end=end, limit=limit): # no-op, unless the server predates filters
       yield key
 
+  async def items(self) -> AsyncIterable[tuple[str, T]]:
+    try:
+      async for key, value in self._stream('/items'):
+        yield key, self.parse(b64decode(value))
+    except RouteMissing: # older server: list the keys and read them (raised before any item is yielded)
+      async for item in super().items():
+        yield item
+
   async def clear(self):
     r = await self._req('DELETE', '/')
     if r.status_code != 200:
@@ -87,9 +257,18 @@ class ClientKV(LocatableKV[T], Generic[T]):
       url += f"token={quote(sign_token(self.secret, expiry))}"
     return url
   
+  def raw(self) -> 'ClientKV[bytes]':
+    return replace(self, parse=default.parse, dump=default.dump) # type: ignore
+
+  def raw_serializers(self):
+    return Serializers(parse=self.parse, dump=self.dump)
+
   def prefixed(self, prefix: str):
     new_prefix = self.prefix_ + '/' + prefix if self.prefix_ else prefix
-    return ClientKV(endpoint=self.endpoint, parse=self.parse, dump=self.dump, secret=self.secret, prefix_=new_prefix)
+    return ClientKV(endpoint=self.endpoint, parse=self.parse, dump=self.dump, secret=self.secret, prefix_=new_prefix, session=self.session)
+  
+  async def aclose(self):
+    await self.session.aclose()
   
 
 @dataclass
@@ -107,6 +286,13 @@ class Served(LocatableKV[T], Generic[T]):
       url += f"token={quote(sign_token(self.secret, expiry))}"
     return url
   
+  def raw(self) -> 'Served[bytes] | None':
+    if (raw := self.kv.raw()) is not None:
+      return Served(self.base_url, raw, self.prefix_, self.secret)
+
+  def raw_serializers(self):
+    return self.kv.raw_serializers()
+
   def prefixed(self, prefix: str):
     new_prefix = self.prefix_ + '/' + prefix if self.prefix_ else prefix
     return Served(self.base_url, self.kv, new_prefix)
@@ -120,8 +306,8 @@ class Served(LocatableKV[T], Generic[T]):
   def delete(self, key):
     return self.kv.prefix(self.prefix_).delete(key)
   
-  def keys(self):
-    return self.kv.prefix(self.prefix_).keys()
+  def keys(self, *, prefix: str = '', start: str | None = None, end: str | None = None, limit: int | None = None):
+    return self.kv.prefix(self.prefix_).keys(prefix=prefix, start=start, end=end, limit=limit)
   
   def items(self):
     return self.kv.prefix(self.prefix_).items()
@@ -132,6 +318,24 @@ class Served(LocatableKV[T], Generic[T]):
   def has(self, key):
     return self.kv.prefix(self.prefix_).has(key)
   
+  def read_many(self, keys, *, max_concurrent: int = 16):
+    return self.kv.prefix(self.prefix_).read_many(keys, max_concurrent=max_concurrent)
+  
+  def insert_many(self, items, *, max_concurrent: int = 16):
+    return self.kv.prefix(self.prefix_).insert_many(items, max_concurrent=max_concurrent)
+  
+  def delete_many(self, keys, *, max_concurrent: int = 16):
+    return self.kv.prefix(self.prefix_).delete_many(keys, max_concurrent=max_concurrent)
+  
+  def has_many(self, keys, *, max_concurrent: int = 16):
+    return self.kv.prefix(self.prefix_).has_many(keys, max_concurrent=max_concurrent)
+  
+  def read_stream(self, key, **kwargs):
+    return self.kv.prefix(self.prefix_).read_stream(key, **kwargs)
+
+  def insert_stream(self, key, chunks, **kwargs):
+    return self.kv.prefix(self.prefix_).insert_stream(key, chunks, **kwargs)
+
   def copy(self, key, to, to_key):
     return self.kv.prefix(self.prefix_).copy(key, to, to_key)
   
@@ -139,4 +343,7 @@ class Served(LocatableKV[T], Generic[T]):
     return self.kv.prefix(self.prefix_).move(key, to, to_key)
   
   def clear(self):
-    return self.kv.prefix(self.prefix_).clear()
\ No newline at end of file
+    return self.kv.prefix(self.prefix_).clear()
+  
+  def aclose(self):
+    return self.kv.aclose()
\ No newline at end of file
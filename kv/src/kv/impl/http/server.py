@@ -1,12 +1,27 @@
-from typing import TypeVar
+from typing import TypeVar, AsyncIterable, Any
 from datetime import datetime
-from pydantic import TypeAdapter
+import json
+from base64 import b64encode, b64decode
 import jwt
 from fastapi import FastAPI, Response, Request, HTTPException
+from fastapi.responses import StreamingResponse
 from kv import KV, InexistentItem
+from kv._abc import CHUNK_SIZE, list_keys
+from kv.serialization import Serializers, default, serializers
 
 T = TypeVar('T')
 
+async def ndjson(xs: AsyncIterable[Any], *, batch_size: int = 256) -> AsyncIterable[str]:
+  """Newline-delimited JSON lines, flushed in batches of `batch_size`"""
+  batch = []
+  async for x in xs:
+    batch.append(json.dumps(x) + '\n')
+    if len(batch) >= batch_size:
+      yield ''.join(batch)
+      batch = []
+  if batch:
+    yield ''.join(batch)
+
 def verify_token(*, token: str, secret: str, now: datetime | None = None) -> bool:
   now = now or datetime.now()
   try:
@@ -20,15 +35,15 @@ def ServerKV(kv: KV[T], *, type: type[T], secret: str | None = None):
   app = FastAPI(generate_unique_id_function=lambda r: r.name)
 
   if type is not bytes:
-    adapter = TypeAdapter(type)
-    parse = adapter.validate_json
-    dump = adapter.dump_json
+    parse, dump = serializers(type)['parse'], serializers(type)['dump']
     media_type = 'application/json'
   else:
-    parse = lambda x: x
-    dump = lambda x: x
+    parse, dump = default.parse, default.dump
     media_type = 'application/octet-stream'
 
+  # if `kv` already stores values in the wire format, reads skip parse/dump
+  raw = kv.raw() if kv.raw_serializers() == Serializers(parse=parse, dump=dump) else None
+
   if secret:
     @app.middleware('http')
     async def check_token(req: Request, call_next):
@@ -40,6 +55,12 @@ def ServerKV(kv: KV[T], *, type: type[T], secret: str | None = None):
       
   def _kv(prefix: str):
     return prefix and kv.prefixed(prefix) or kv
+
+  def _reader(prefix: str) -> tuple[KV, Any]:
+    """`KV` to read from, and how to dump its values"""
+    if raw is not None:
+      return (prefix and raw.prefixed(prefix) or raw), default.dump
+    return _kv(prefix), dump
   
   @app.post('/item/{key:path}')
   async def insert(key: str, *, req: Request, prefix: str = ''):
@@ -48,14 +69,37 @@ def ServerKV(kv: KV[T], *, type: type[T], secret: str | None = None):
 
   @app.get('/item/{key:path}')
   async def read(key: str, *, prefix: str = ''):
+    reader, dump = _reader(prefix)
     try:
-      item = await _kv(prefix).read(key)
+      item = await reader.read(key)
       return Response(content=dump(item), media_type=media_type)
     except InexistentItem:
       raise HTTPException(status_code=404, detail=f'Inexistent Item "{key}"')
   
-  @app.get('/item/{key:path}/has')
+  @app.get('/stream/{key:path}')
+  async def read_stream(key: str, *, prefix: str = '', chunk_size: int = CHUNK_SIZE):
+    """Streams the item's stored bytes, without loading it whole"""
+    chunks = aiter(_kv(prefix).read_stream(key, chunk_size=chunk_size))
+    try: # fetch the first chunk before responding, to 404 on inexistent items
+      first = await anext(chunks)
+    except StopAsyncIteration:
+      first = b''
+    except InexistentItem:
+      raise HTTPException(status_code=404, detail=f'Inexistent Item "{key}"')
+    async def body():
+      yield first
+      async for chunk in chunks:
+        yield chunk
+    return StreamingResponse(body(), media_type='application/octet-stream')
+
+  @app.post('/stream/{key:path}')
+  async def insert_stream(key: str, *, req: Request, prefix: str = ''):
+    """Stores the (raw) request body as it arrives, without buffering it whole"""
+    await _kv(prefix).insert_stream(key, (chunk async for chunk in req.stream() if chunk))
+
+  @app.get('/has/{key:path}')
   async def has(key: str, *, res: Response, prefix: str = '') -> bool:
+    """200 if `key` exists, 404 otherwise (`/item/{key}/has` would be matched by `GET /item/{key}`)"""
     has = await _kv(prefix).has(key)
     res.status_code = 200 if has else 404
     return has
@@ -67,9 +111,41 @@ def ServerKV(kv: KV[T], *, type: type[T], secret: str | None = None):
     except InexistentItem:
       return Response(status_code=404, content=f'Inexistent Item "{key}"')
 
+  @app.post('/batch/read')
+  async def read_many(keys: list[str], prefix: str = '') -> list[str | None]:
+    reader, dump = _reader(prefix)
+    items = await reader.read_many(keys)
+    return [None if item is None else b64encode(dump(item)).decode() for item in items]
+  
+  @app.post('/batch/insert')
+  async def insert_many(items: dict[str, str], prefix: str = ''):
+    await _kv(prefix).insert_many({k: parse(b64decode(v)) for k, v in items.items()})
+
+  @app.post('/batch/delete')
+  async def delete_many(keys: list[str], prefix: str = ''):
+    await _kv(prefix).delete_many(keys)
+
+  @app.post('/batch/has')
+  async def has_many(keys: list[str], prefix: str = '') -> list[bool]:
+    return await _kv(prefix).has_many(keys)
+
   @app.get('/keys')
-  async def keys(prefix: str = ''):
-    return [key async for key in _kv(prefix).keys()]
+  async def keys(
+    prefix: str = '', key_prefix: str = '', start: str | None = None,
+    end: str | None = None, limit: int | None = None
+  ):
+    """Streams keys as NDJSON (one JSON string per line), filtered as `KV.keys(prefix=key_prefix, start=start, end=end, limit=limit)`"""
+    keys = list_keys(_kv(prefix), prefix=key_prefix, start=start, end=end, limit=limit)
+    return StreamingResponse(ndjson(keys), media_type='application/x-ndjson')
+  
+  @app.get('/items')
+  async def items(prefix: str = ''):
+    """Streams items as NDJSON (one `[key, base64 value]` per line)"""
+    reader, dump = _reader(prefix)
+    async def pairs():
+      async for key, value in reader.items():
+        yield key, b64encode(dump(value)).decode()
+    return StreamingResponse(ndjson(pairs()), media_type='application/x-ndjson')
   
   @app.delete('/')
   async def clear(prefix: str = ''):
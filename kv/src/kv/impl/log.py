@@ -0,0 +1,363 @@
+from typing_extensions import TypeVar, Generic, NamedTuple, Iterable, Sequence, Mapping, Any, overload
+from dataclasses import dataclass
+import os
+import mmap
+import struct
+import zlib
+import asyncio
+import itertools
+from kv import KV, KVError, InexistentItem
+from kv.serialization import Parse, Dump, default, serializers
+from kv._abc import key_range, item_pairs
+from .fs import fsync_path
+
+T = TypeVar('T')
+U = TypeVar('U')
+
+HEADER = struct.Struct('>IQIIB')
+"""Record header: crc32 (of everything after it), sequence number, key size, value size, flags"""
+HINT = struct.Struct('>QIQI')
+"""Hint entry: sequence number, key size, value offset, value size (followed by the key)"""
+TOMBSTONE = 1
+
+class Loc(NamedTuple):
+  """Location of a key's latest value"""
+  segment: int
+  offset: int
+  size: int
+  seq: int
+
+def encode_record(seq: int, key: bytes, value: bytes, flags: int = 0) -> bytes:
+  body = HEADER.pack(0, seq, len(key), len(value), flags)[4:] + key + value
+  return struct.pack('>I', zlib.crc32(body)) + body
+
+def record_size(key: str, value_size: int) -> int:
+  return HEADER.size + len(key.encode()) + value_size
+
+def write_all(fd: int, data: bytes | bytearray):
+  view = memoryview(data)
+  while view:
+    view = view[os.write(fd, view):]
+
+def scan_segment(path: str) -> tuple[list[tuple[str, int, int, int, bool]], int]:
+  """Scan a data segment. Returns `([(key, value offset, value size, seq, is tombstone)], end of the last valid record)`"""
+  entries = []
+  size = os.path.getsize(path)
+  if size == 0:
+    return entries, 0
+  with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+    pos = 0
+    while pos + HEADER.size <= size:
+      crc, seq, ksize, vsize, flags = HEADER.unpack_from(data, pos)
+      end = pos + HEADER.size + ksize + vsize
+      if end > size or zlib.crc32(data[pos+4:end]) != crc:
+        break # torn write (crash) or corruption: the rest of the segment is discarded
+      key = data[pos+HEADER.size:pos+HEADER.size+ksize].decode()
+      entries.append((key, pos + HEADER.size + ksize, vsize, seq, bool(flags & TOMBSTONE)))
+      pos = end
+  return entries, pos
+
+def read_hints(path: str) -> list[tuple[str, int, int, int, bool]]:
+  entries = []
+  with open(path, 'rb') as f:
+    data = f.read()
+  pos = 0
+  while pos < len(data):
+    seq, ksize, offset, vsize = HINT.unpack_from(data, pos)
+    pos += HINT.size
+    key = data[pos:pos+ksize].decode()
+    pos += ksize
+    entries.append((key, offset, vsize, seq, False))
+  return entries
+
+def merge(
+  base: str, live: list[tuple[str, Loc]], ids: 'itertools.count[int]', max_segment_size: int
+) -> tuple[list[tuple[str, Loc, Loc]], dict[int, int]]:
+  """Copy the `live` records into new (hinted) segments. Returns `([(key, old loc, new loc)], {new segment: size})`. Runs in a worker thread"""
+  moved = []
+  sizes = {}
+  readers: dict[int, int] = {}
+  out = hints = None
+  seg = pos = 0
+
+  def finish():
+    if out is None or hints is None:
+      return
+    os.fsync(out.fileno())
+    out.close()
+    hints.close()
+    os.replace(segment_path(base, seg) + '.tmp', segment_path(base, seg))
+    os.replace(hint_path(base, seg) + '.tmp', hint_path(base, seg))
+    sizes[seg] = pos
+
+  try:
+    for key, loc in live:
+      if out is None or pos >= max_segment_size:
+        finish()
+        seg, pos = next(ids), 0
+        out = open(segment_path(base, seg) + '.tmp', 'wb')
+        hints = open(hint_path(base, seg) + '.tmp', 'wb')
+      if (fd := readers.get(loc.segment)) is None:
+        fd = readers[loc.segment] = os.open(segment_path(base, loc.segment), os.O_RDONLY)
+      value = os.pread(fd, loc.size, loc.offset)
+      k = key.encode()
+      out.write(encode_record(loc.seq, k, value)) # type: ignore
+      hints.write(HINT.pack(loc.seq, len(k), pos + HEADER.size + len(k), len(value)) + k) # type: ignore
+      moved.append((key, loc, Loc(seg, pos + HEADER.size + len(k), len(value), loc.seq)))
+      pos += HEADER.size + len(k) + len(value)
+    finish()
+  finally:
+    for fd in readers.values():
+      os.close(fd)
+  return moved, sizes
+
+def remove_segments(base: str, segments: Iterable[int]):
+  """Durably remove compacted `segments`, after persisting the merged ones. Oldest first, syncing each removal:
+  a crash midway never leaves a value whose tombstone (dropped by `merge`) was in an already removed segment
+  """
+  fsync_path(base)
+  for seg in sorted(segments):
+    os.remove(segment_path(base, seg))
+    if os.path.exists(hint_path(base, seg)):
+      os.remove(hint_path(base, seg))
+    fsync_path(base)
+
+def segment_path(base: str, segment: int) -> str:
+  return os.path.join(base, f'{segment:010d}.data')
+
+def hint_path(base: str, segment: int) -> str:
+  return os.path.join(base, f'{segment:010d}.hint')
+
+@dataclass
+class LogKV(KV[T], Generic[T]):
+  """Log-structured (bitcask-style) `KV`: records are appended to segment files, and an in-memory index (the keydir) maps each key to its latest value.
+  Reads are a single `pread`. Suited for many small values. Single-process only.
+  - `max_segment_size`: size (bytes) at which a new segment is started
+  - `compaction_threshold`: fraction of dead bytes that triggers a background compaction (`None` to disable)
+  - `compaction_min_bytes`: don't compact for less than this many dead bytes
+  - `sync`: fsync after every write
+  """
+  path: str
+  parse: Parse[T] = default[T].parse
+  dump: Dump[T] = default[T].dump
+  max_segment_size: int = 64 * 2**20
+  compaction_threshold: float | None = 0.5
+  compaction_min_bytes: int = 2**20
+  sync: bool = False
+
+  @classmethod
+  @overload
+  def new(cls, path: str, *, sync: bool = False, compression: str | None = None) -> 'LogKV[bytes]':
+    ...
+  @classmethod
+  @overload
+  def new(cls, path: str, type: type[U] | None = None, *, sync: bool = False, format: str = 'json', compression: str | None = None) -> 'LogKV[U]':
+    ...
+  @classmethod
+  def new(cls, path: str, type: type | None = None, *, sync: bool = False, format: str = 'json', compression: str | None = None) -> 'LogKV[Any]':
+    return LogKV(path, **serializers(type or bytes, format=format, compression=compression), sync=sync)
+
+  def __post_init__(self):
+    os.makedirs(self.path, exist_ok=True)
+    self.keydir: dict[str, Loc] = {}
+    self.sizes: dict[int, int] = {}
+    """Total bytes per segment"""
+    self.dead: dict[int, int] = {}
+    """Bytes of overwritten/deleted records per segment"""
+    self.readers: dict[int, int] = {}
+    self.compaction: asyncio.Task | None = None
+    self.load()
+
+  def __repr__(self):
+    return f'LogKV(path={self.path!r}, keys={len(self.keydir)}, segments={len(self.sizes)})'
+
+  def load(self):
+    for f in os.listdir(self.path):
+      if f.endswith('.tmp'): # leftovers of an interrupted compaction
+        os.remove(os.path.join(self.path, f))
+    segments = sorted(int(f.removesuffix('.data')) for f in os.listdir(self.path) if f.endswith('.data'))
+    latest: dict[str, Loc | None] = {}
+    seqs: dict[str, int] = {}
+    last_unhinted = None
+    for seg in segments:
+      if os.path.exists(hint_path(self.path, seg)):
+        entries = read_hints(hint_path(self.path, seg))
+        self.sizes[seg] = os.path.getsize(segment_path(self.path, seg))
+      else:
+        entries, end = scan_segment(segment_path(self.path, seg))
+        if end < os.path.getsize(segment_path(self.path, seg)):
+          os.truncate(segment_path(self.path, seg), end)
+        self.sizes[seg] = end
+        last_unhinted = seg
+      for key, offset, size, seq, tombstone in entries:
+        if seq >= seqs.get(key, -1):
+          seqs[key] = seq
+          latest[key] = None if tombstone else Loc(seg, offset, size, seq)
+
+    self.keydir = {k: loc for k, loc in latest.items() if loc is not None}
+    self.seq = max(seqs.values(), default=0)
+    live = dict.fromkeys(self.sizes, 0)
+    for key, loc in self.keydir.items():
+      live[loc.segment] += record_size(key, loc.size)
+    self.dead = {seg: size - live[seg] for seg, size in self.sizes.items()}
+
+    self.ids = itertools.count(max(segments, default=0) + 1)
+    if last_unhinted is not None and last_unhinted == max(segments) and self.sizes[last_unhinted] < self.max_segment_size:
+      self.open_active(last_unhinted)
+    else:
+      self.open_active(next(self.ids))
+
+  def open_active(self, segment: int):
+    self.active = segment
+    self.writer = os.open(segment_path(self.path, segment), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+    self.sizes.setdefault(segment, 0)
+    self.dead.setdefault(segment, 0)
+
+  def rotate(self):
+    os.close(self.writer)
+    self.open_active(next(self.ids))
+
+  def reader(self, segment: int) -> int:
+    if (fd := self.readers.get(segment)) is None:
+      fd = self.readers[segment] = os.open(segment_path(self.path, segment), os.O_RDONLY)
+    return fd
+
+  def read_value(self, loc: Loc) -> bytes:
+    return os.pread(self.reader(loc.segment), loc.size, loc.offset)
+
+  def discard(self, key: str):
+    if (old := self.keydir.pop(key, None)) is not None:
+      self.dead[old.segment] += record_size(key, old.size)
+
+  def append(self, records: Iterable[tuple[str, bytes | None]]):
+    """Append records to the active segment and update the keydir. A `None` value is a tombstone"""
+    buf = bytearray()
+    updates = []
+    pos = self.sizes[self.active]
+    for key, value in records:
+      self.seq += 1
+      k = key.encode()
+      rec = encode_record(self.seq, k, value or b'', TOMBSTONE if value is None else 0)
+      updates.append((key, value, Loc(self.active, pos + len(buf) + HEADER.size + len(k), len(value or b''), self.seq), len(rec)))
+      buf += rec
+    if not buf:
+      return
+    try:
+      write_all(self.writer, buf)
+      if self.sync:
+        os.fsync(self.writer)
+    except OSError as e:
+      raise KVError(str(e)) from e
+    self.sizes[self.active] = pos + len(buf)
+    for key, value, loc, size in updates:
+      self.discard(key)
+      if value is None:
+        self.dead[self.active] += size
+      else:
+        self.keydir[key] = loc
+    if self.sizes[self.active] >= self.max_segment_size:
+      self.rotate()
+    self.maybe_compact()
+
+  def maybe_compact(self):
+    if self.compaction_threshold is None or self.compaction is not None:
+      return
+    dead = sum(self.dead.values())
+    if dead >= self.compaction_min_bytes and dead >= self.compaction_threshold * sum(self.sizes.values()):
+      self.compaction = asyncio.get_running_loop().create_task(self._compact())
+
+  async def compact(self):
+    """Rewrite all segments keeping only live records (plus hint files for fast startup), then delete the old ones.
+    The heavy lifting runs in a worker thread. Joins the running compaction, if any"""
+    if self.compaction is None:
+      self.compaction = asyncio.get_running_loop().create_task(self._compact())
+    await asyncio.shield(self.compaction)
+
+  async def _compact(self):
+    try:
+      self.rotate()
+      old = set(self.sizes) - {self.active}
+      live = sorted(((k, loc) for k, loc in self.keydir.items() if loc.segment in old), key=lambda x: (x[1].segment, x[1].offset))
+      moved, sizes = await asyncio.to_thread(merge, self.path, live, self.ids, self.max_segment_size)
+      for seg, size in sizes.items():
+        self.sizes[seg] = size
+        self.dead[seg] = 0
+      for key, old_loc, new_loc in moved:
+        if self.keydir.get(key) == old_loc:
+          self.keydir[key] = new_loc
+        else: # overwritten or deleted while compacting
+          self.dead[new_loc.segment] += record_size(key, new_loc.size)
+      for seg in old:
+        if (fd := self.readers.pop(seg, None)) is not None:
+          os.close(fd)
+        del self.sizes[seg], self.dead[seg]
+      await asyncio.to_thread(remove_segments, self.path, old)
+    except OSError as e:
+      raise KVError(str(e)) from e
+    finally:
+      self.compaction = None
+
+  async def insert(self, key: str, value: T):
+    self.append([(key, self.dump(value))])
+
+  async def insert_many(self, items: Mapping[str, T] | Iterable[tuple[str, T]], *, max_concurrent: int = 16):
+    pairs = item_pairs(items)
+    self.append([(k, self.dump(v)) for k, v in pairs])
+
+  async def read(self, key: str) -> T:
+    if (loc := self.keydir.get(key)) is None:
+      raise InexistentItem(key)
+    try:
+      return self.parse(self.read_value(loc))
+    except OSError as e:
+      raise KVError(str(e)) from e
+
+  async def read_many(self, keys: Sequence[str], *, max_concurrent: int = 16) -> list[T | None]:
+    try:
+      return [None if (loc := self.keydir.get(key)) is None else self.parse(self.read_value(loc)) for key in keys]
+    except OSError as e:
+      raise KVError(str(e)) from e
+
+  async def has(self, key: str) -> bool:
+    return key in self.keydir
+
+  async def has_many(self, keys: Sequence[str], *, max_concurrent: int = 16) -> list[bool]:
+    return [key in self.keydir for key in keys]
+
+  async def delete(self, key: str):
+    if key not in self.keydir:
+      raise InexistentItem(key)
+    self.append([(key, None)])
+
+  async def delete_many(self, keys: Sequence[str], *, max_concurrent: int = 16):
+    self.append([(key, None) for key in dict.fromkeys(keys) if key in self.keydir])
+
+  async def keys(self, *, prefix: str = '', start: str | None = None, end: str | None = None, limit: int | None = None):
+    matches = key_range(prefix, start, end)
+    for key in itertools.islice((k for k in list(self.keydir) if matches(k)), limit):
+      yield key
+
+  async def items(self):
+    for key in list(self.keydir):
+      if (loc := self.keydir.get(key)) is not None:
+        yield key, self.parse(self.read_value(loc))
+
+  async def clear(self):
+    await self.aclose()
+    for f in os.listdir(self.path):
+      if f.endswith(('.data', '.hint', '.tmp')):
+        os.remove(os.path.join(self.path, f))
+    self.__post_init__()
+
+  async def aclose(self):
+    if self.compaction is not None:
+      try:
+        await self.compaction
+      except KVError:
+        ...
+    for fd in self.readers.values():
+      os.close(fd)
+    self.readers.clear()
+    if self.writer >= 0:
+      os.close(self.writer)
+      self.writer = -1
@@ -1,8 +1,10 @@
-from typing_extensions import Generic, TypeVar, Callable, overload, ParamSpec, Awaitable, AsyncIterable
-from dataclasses import dataclass
+from typing_extensions import Generic, TypeVar, Callable, overload, ParamSpec, Awaitable, AsyncIterable, Sequence, Mapping, Iterable, Any, cast
+from dataclasses import dataclass, field, replace
+import re
 import redis.asyncio as redis
 from kv import KV, KVError, InexistentItem
-from kv.serialization import Parse, Dump, default, serializers
+from kv._abc import filter_keys, item_pairs
+from kv.serialization import Parse, Dump, Serializers, default, serializers
 
 T = TypeVar('T')
 L = TypeVar('L')
@@ -16,61 +18,167 @@ def redis_safe(f: Callable[Ps, Awaitable[T]]):
       raise KVError(str(e)) from e
   return wrapper
 
+UNLINK_BATCH = 500
+"""Keys per `UNLINK` command when clearing a namespace"""
+
+def glob_escape(pattern: str) -> str:
+  """Escape redis glob-style pattern characters"""
+  return re.sub(r'([*?\[\]\\])', r'\\\1', pattern)
+
 def ensure_str(s: str | bytes) -> str:
   return s.decode() if isinstance(s, bytes) else s # type: ignore
 
 @dataclass
 class RedisKV(KV[T], Generic[T]):
-  """Redis-based `KV` implementation"""
+  """Redis-based `KV` implementation
+  - `scan_count`: `SCAN ... COUNT` hint, i.e. keys fetched per round trip when iterating (also the `MGET`/`UNLINK` batch size)
+  - `prefix_`: namespace prepended to every key. `clear()` only deletes keys within it
+  """
   client: redis.Redis
   parse: Parse[T] = default[T].parse
   dump: Dump[T] = default[T].dump
+  scan_count: int = 1000
+  prefix_: str = ''
+  owns_client: bool = field(default=True, repr=False)
+  """Whether `client` is closed on garbage collection (prefixed copies share their parent's client)"""
 
   def __repr__(self):
-    return f'RedisKV({self.client!r})'
+    return f'RedisKV({self.client!r}, prefix={self.prefix_!r})'
 
   @staticmethod
   @overload
-  def from_url(url: str, *, parse: Parse[T] = default[T].parse, dump: Dump[T] = default[T].dump) -> 'RedisKV[T]':
+  def from_url(url: str, *, parse: Parse[T] = default[T].parse, dump: Dump[T] = default[T].dump, scan_count: int = 1000) -> 'RedisKV[T]':
     ...
   @staticmethod
   @overload
-  def from_url(url: str, type: type[T] | None = None) -> 'RedisKV[T]':
+  def from_url(url: str, type: type[T] | None = None, *, scan_count: int = 1000, format: str = 'json', compression: str | None = None) -> 'RedisKV[T]':
     ...
   @staticmethod
-  def from_url(url: str, type = None, parse = default[T].parse, dump = default[T].dump) -> 'RedisKV[T]':
+  def from_url(
+    url: str, type: type | None = None, parse: Parse = default.parse, dump: Dump = default.dump, scan_count: int = 1000,
+    format: str = 'json', compression: str | None = None
+  ) -> 'RedisKV[Any]':
     client = redis.Redis.from_url(url)
-    return RedisKV(client, parse, dump) if type is None else RedisKV(client, **serializers(type))
+    return (
+      RedisKV(client, parse, dump, scan_count=scan_count) if type is None and compression is None
+      else RedisKV(client, **serializers(type or bytes, format=format, compression=compression), scan_count=scan_count)
+    )
 
   @redis_safe
   async def insert(self, key: str, value: T):
-    await self.client.set(key, self.dump(value))
+    await self.client.set(self.prefix_ + key, self.dump(value))
   
   @redis_safe
   async def read(self, key: str) -> T:
-    if (val := await self.client.get(key)) is None:
+    if (val := await self.client.get(self.prefix_ + key)) is None:
       raise InexistentItem(key)
     else:
-      return self.parse(val)
+      return self.parse(cast(bytes, val)) # no `decode_responses`: values come back as bytes
   
+  @redis_safe
+  async def has(self, key: str) -> bool:
+    return await self.client.exists(self.prefix_ + key) > 0
+
   @redis_safe
   async def delete(self, key: str):
-    if (await self.client.delete(key)) == 0:
+    if (await self.client.delete(self.prefix_ + key)) == 0:
       raise InexistentItem(key)
   
-  async def keys(self) -> AsyncIterable[str]:
-    try:
-      keys = await self.client.keys()
+  @redis_safe
+  async def read_many(self, keys: Sequence[str], *, max_concurrent: int = 16) -> list[T | None]:
+    if not keys:
+      return []
+    vals = await self.client.mget([self.prefix_ + key for key in keys])
+    return [None if val is None else self.parse(cast(bytes, val)) for val in vals]
+  
+  @redis_safe
+  async def insert_many(self, items: Mapping[str, T] | Iterable[tuple[str, T]], *, max_concurrent: int = 16):
+    pairs = item_pairs(items)
+    mapping = {self.prefix_ + k: self.dump(v) for k, v in pairs}
+    if mapping:
+      await self.client.mset(mapping)
+
+  @redis_safe
+  async def delete_many(self, keys: Sequence[str], *, max_concurrent: int = 16):
+    async with self.client.pipeline(transaction=False) as pipe:
+      for key in keys:
+        pipe.delete(self.prefix_ + key)
+      await pipe.execute()
+
+  @redis_safe
+  async def has_many(self, keys: Sequence[str], *, max_concurrent: int = 16) -> list[bool]:
+    async with self.client.pipeline(transaction=False) as pipe:
       for key in keys:
-        yield ensure_str(key)
+        pipe.exists(self.prefix_ + key)
+      return [bool(n) for n in await pipe.execute()]
+  
+  def scan(self, prefix: str = '') -> AsyncIterable[bytes]:
+    """Incremental `SCAN MATCH <prefix>* COUNT <scan_count>` (never blocks the server like `KEYS`)"""
+    return self.client.scan_iter(match=glob_escape(self.prefix_ + prefix) + '*', count=self.scan_count)
+
+  async def keys(self, *, prefix: str = '', start: str | None = None, end: str | None = None, limit: int | None = None) -> AsyncIterable[str]:
+    """`SCAN`s keys matching `prefix`. `start`/`end`/`limit` are applied client-side"""
+    try:
+      keys = (ensure_str(key).removeprefix(self.prefix_) async for key in self.scan(prefix))
+      async for key in filter_keys(keys, start=start, end=end, limit=limit):
+        yield key
+    except redis.RedisError as e:
+      raise KVError(str(e)) from e
+
+  async def items(self) -> AsyncIterable[tuple[str, T]]:
+    """`SCAN`s keys, fetching values with one `MGET` per `scan_count` keys. Keys deleted in between are skipped"""
+    async def fetch(keys: list[bytes]):
+      for key, val in zip(keys, await self.client.mget(keys)):
+        if val is not None:
+          yield ensure_str(key).removeprefix(self.prefix_), self.parse(cast(bytes, val))
+    try:
+      batch = []
+      async for key in self.scan():
+        batch.append(key)
+        if len(batch) >= self.scan_count:
+          async for item in fetch(batch):
+            yield item
+          batch = []
+      if batch:
+        async for item in fetch(batch):
+          yield item
     except redis.RedisError as e:
       raise KVError(str(e)) from e
 
   @redis_safe
   async def clear(self):
-    await self.client.flushdb()
+    """`SCAN`s the namespace (the whole database, if not prefixed) and `UNLINK`s it in pipelined batches, so the server never blocks"""
+    async def unlink(keys: list[bytes]):
+      async with self.client.pipeline(transaction=False) as pipe:
+        for i in range(0, len(keys), UNLINK_BATCH):
+          pipe.unlink(*keys[i:i+UNLINK_BATCH])
+        await pipe.execute()
+    batch = []
+    async for key in self.scan():
+      batch.append(key)
+      if len(batch) >= self.scan_count:
+        await unlink(batch)
+        batch = []
+    if batch:
+      await unlink(batch)
+
+  def raw(self) -> 'RedisKV[bytes]':
+    return replace(self, parse=default.parse, dump=default.dump, owns_client=False) # type: ignore
+
+  def raw_serializers(self):
+    return Serializers(parse=self.parse, dump=self.dump)
+
+  def prefixed(self, prefix: str):
+    """Same key layout as `PrefixedKV` (`prefix + key`, nested prefixes joined by `/`), so existing data stays visible"""
+    new_prefix = (self.prefix_.rstrip('/') + '/' + prefix.strip('/')).lstrip('/') if self.prefix_ else prefix
+    return replace(self, prefix_=new_prefix, owns_client=False)
+
+  async def aclose(self):
+    await self.client.aclose()
   
   def __del__(self):
+    if not self.owns_client:
+      return
     import asyncio
     async def cleanup():
       await self.client.close()
@@ -1,19 +1,168 @@
-from typing_extensions import AsyncIterable, TypeVar, Generic, Any, overload
+from typing_extensions import AsyncIterable, TypeVar, Generic, Any, Callable, overload, cast, Sequence, Mapping, Iterable
 from dataclasses import dataclass, replace
-from pydantic import RootModel
-from sqlalchemy import Engine
+import sqlalchemy
+from sqlalchemy import Engine, Table, Select, Delete, Executable, select, insert, delete
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 from sqlalchemy.exc import DatabaseError
 from sqlalchemy.types import BLOB, String
 from sqlalchemy.dialects.postgresql.types import BYTEA
 from sqltypes import ValidatedJSON
 from kv import KV, KVError, InexistentItem
+from kv._abc import item_pairs, prefix_end
 
 T = TypeVar('T')
 U = TypeVar('U')
 
+MAX_PARAMS = 500
+"""Max. keys bound in a single `IN (...)` clause (SQLite caps bound parameters)"""
+
+PAGE_SIZE = 1000
+"""Keys fetched per query when iterating keys"""
+
+def chunked(xs: Sequence[U], size: int = MAX_PARAMS) -> Iterable[Sequence[U]]:
+  for i in range(0, len(xs), size):
+    yield xs[i:i+size]
+
+def pool_options(pool_size: int | None = None, max_overflow: int | None = None) -> dict:
+  """Connection pool kwargs for `create_engine` (unset ones keep sqlalchemy's defaults)"""
+  opts = dict(pool_size=pool_size, max_overflow=max_overflow)
+  return {k: v for k, v in opts.items() if v is not None}
+
+def define_table(Type: type, table: str, dialect: str):
+  """ORM `(Base, Table)` for values of `Type`, plus its `(parse, dump)` value converters"""
+
+  class Base(DeclarativeBase):
+    ...
+
+  if Type is bytes:
+    dump = parse = lambda x: x
+    class Table(Base): # type: ignore
+      __tablename__ = table
+      key: Mapped[str] = mapped_column(primary_key=True)
+      value: Mapped[bytes] = mapped_column(type_=BYTEA if dialect == 'postgresql' else BLOB)
+
+  elif Type is str:
+    dump = parse = lambda x: x
+    class Table(Base): # type: ignore
+      __tablename__ = table
+      key: Mapped[str] = mapped_column(primary_key=True)
+      value: Mapped[str] = mapped_column(type_=String)
+    
+  else: # the column type validates/dumps values itself (with a `TypeAdapter`)
+    Type = Type or Any
+    dump = parse = lambda x: x
+    class Table(Base):
+      __tablename__ = table
+      key: Mapped[str] = mapped_column(primary_key=True)
+      value: Mapped[Type] = mapped_column(type_=ValidatedJSON(Type, name='Value')) # type: ignore
+
+  return Base, Table, parse, dump
+
+def upsert_stmt(table: Table, dialect: str):
+  """Single-statement upsert (`ON CONFLICT`/`ON DUPLICATE KEY`), if the dialect supports it. Executed with `[{'key': ..., 'value': ...}]` params"""
+  if dialect in ('sqlite', 'postgresql'):
+    if dialect == 'sqlite':
+      from sqlalchemy.dialects.sqlite import insert
+    else:
+      from sqlalchemy.dialects.postgresql import insert
+    stmt = insert(table)
+    return stmt.on_conflict_do_update(index_elements=[table.c.key], set_={'value': stmt.excluded.value})
+  if dialect in ('mysql', 'mariadb'):
+    from sqlalchemy.dialects.mysql import insert
+    stmt = insert(table)
+    return stmt.on_duplicate_key_update(value=stmt.inserted.value)
+
+def key_range(table: Table, dialect: str, prefix: str = '', start: str | None = None, end: str | None = None) -> list:
+  """`WHERE` clauses matching keys starting with `prefix`, within `[start, end)`.
+  Prefixes are matched as key ranges on SQLite (binary collation, uses the primary key index), with `LIKE 'prefix%'` otherwise
+  """
+  clauses = []
+  if prefix and dialect == 'sqlite':
+    clauses.append(table.c.key >= prefix)
+    if (hi := prefix_end(prefix)) is not None:
+      clauses.append(table.c.key < hi)
+  elif prefix:
+    clauses.append(table.c.key.startswith(prefix, autoescape=True))
+  if start is not None:
+    clauses.append(table.c.key >= start)
+  if end is not None:
+    clauses.append(table.c.key < end)
+  return clauses
+
+class SQLStatements:
+  """Statements shared by `SQLKV` and `AsyncSQLKV`, which only differ in how they execute them"""
+  Table: Any
+  prefix_: str
+  dump: Callable[[Any], Any]
+
+  @property
+  def dialect(self) -> str:
+    return self.engine.dialect.name # type: ignore
+
+  @property
+  def sql_table(self) -> sqlalchemy.Table:
+    """The ORM model's `Table` (`__table__` is typed as a generic `FromClause`)"""
+    return cast(sqlalchemy.Table, self.Table.__table__)
+
+  def full_keys(self, keys: Sequence[str]) -> list[str]:
+    return [self.prefix_ + key for key in keys]
+
+  def rows(self, items: Iterable[tuple[str, Any]]) -> list[dict]:
+    """`[{'key': ..., 'value': ...}]` params of `write` (the last value of repeated keys wins)"""
+    rows = {self.prefix_ + k: self.dump(v) for k, v in items}
+    return [{'key': k, 'value': v} for k, v in rows.items()]
+
+  def write(self, rows: list[dict]) -> list[tuple[Executable, list[dict] | None]]:
+    """`(statement, params)` upserting `rows`: a single upsert if the dialect supports it, otherwise delete + insert (to run within a transaction)"""
+    if (stmt := upsert_stmt(self.sql_table, self.dialect)) is not None:
+      return [(stmt, rows)]
+    stmts: list[tuple[Executable, list[dict] | None]] = [(stmt, None) for stmt in self.delete_in([row['key'] for row in rows])]
+    return stmts + [(insert(self.sql_table), rows)]
+
+  def read_one(self, key: str):
+    table = self.sql_table
+    return select(table.c.value).where(table.c.key == self.prefix_ + key)
+
+  def has_one(self, key: str):
+    table = self.sql_table
+    return select(1).where(table.c.key == self.prefix_ + key).limit(1)
+
+  def delete_one(self, key: str):
+    table = self.sql_table
+    return delete(table).where(table.c.key == self.prefix_ + key)
+
+  def select_in(self, full_keys: Sequence[str], *columns: str) -> list[Select]:
+    """One `SELECT <columns> ... WHERE key IN (...)` per `MAX_PARAMS` keys"""
+    table = self.sql_table
+    return [select(*[table.c[c] for c in columns]).where(table.c.key.in_(chunk)) for chunk in chunked(full_keys)]
+
+  def delete_in(self, full_keys: Sequence[str]) -> list[Delete]:
+    """One `DELETE ... WHERE key IN (...)` per `MAX_PARAMS` keys"""
+    table = self.sql_table
+    return [delete(table).where(table.c.key.in_(chunk)) for chunk in chunked(full_keys)]
+
+  def where(self, prefix: str = '', start: str | None = None, end: str | None = None) -> list:
+    return key_range(self.sql_table, self.dialect, self.prefix_ + prefix, start and self.prefix_ + start, end and self.prefix_ + end)
+
+  def keys_page(self, where: list, n: int, last: str | None = None) -> Select:
+    """Next `n` keys (in order) matching `where`, after `last` (keyset pagination)"""
+    table = self.sql_table
+    stmt = select(table.c.key).where(*where).order_by(table.c.key).limit(n)
+    return stmt if last is None else stmt.where(table.c.key > last)
+
+  def select_all(self) -> Select:
+    table = self.sql_table
+    return select(table.c.key, table.c.value).where(*self.where())
+
+  def delete_all(self) -> Delete:
+    return delete(self.sql_table).where(*self.where())
+
+  def prefixed(self, prefix: str):
+    new_prefix = self.prefix_.rstrip('/') + '/' + prefix.strip('/')
+    return replace(self, prefix_=new_prefix.lstrip('/')) # type: ignore
+
 @dataclass
-class SQLKV(KV[T], Generic[T]):
+class SQLKV(SQLStatements, KV[T], Generic[T]):
   """`KV` implementation over sqlalchemy"""
 
   Type: type[T]
@@ -22,128 +171,130 @@ class SQLKV(KV[T], Generic[T]):
   prefix_: str = ''
 
   def __post_init__(self):
-
-    class Base(DeclarativeBase):
-      ...
-
-    if self.Type is bytes:
-      self.dump = lambda x: x
-      self.parse = lambda x: x
-      class Table(Base): # type: ignore
-        __tablename__ = self.table
-        key: Mapped[str] = mapped_column(primary_key=True)
-        value: Mapped[bytes] = mapped_column(type_=BYTEA if self.engine.dialect.name == 'postgresql' else BLOB)
-
-    elif self.Type is str:
-      self.dump = lambda x: x
-      self.parse = lambda x: x
-      class Table(Base): # type: ignore
-        __tablename__ = self.table
-        key: Mapped[str] = mapped_column(primary_key=True)
-        value: Mapped[str] = mapped_column(type_=String)
-      
-    else:
-      self.Type = self.Type or Any
-      Root = RootModel[self.Type]
-      self.dump = lambda x: Root(x)
-      self.parse = lambda x: x.root
-      class Table(Base):
-        __tablename__ = self.table
-        key: Mapped[str] = mapped_column(primary_key=True)
-        value: Mapped[RootModel[self.Type]] = mapped_column(type_=ValidatedJSON(Root)) # type: ignore
-
-    self.Table = Table
-    self.Base = Base
-    Base.metadata.create_all(self.engine)
-
+    self.Base, self.Table, self.parse, self.dump = define_table(self.Type, self.table, self.engine.dialect.name)
+    self.Base.metadata.create_all(self.engine)
 
   @overload
   @classmethod
-  def new(cls, conn_str: str, *, table: str) -> 'SQLKV[bytes]':
+  def new(cls, conn_str: str, *, table: str, pool_size: int | None = None, max_overflow: int | None = None) -> 'SQLKV[bytes]':
     ...
   @overload
   @classmethod
-  def new(cls, conn_str: str, type: type[U] | None = None, *, table: str) -> 'SQLKV[U]':
+  def new(cls, conn_str: str, type: type[U] | None = None, *, table: str, pool_size: int | None = None, max_overflow: int | None = None) -> 'SQLKV[U]':
     ...
   @classmethod
-  def new(cls, conn_str: str, type: type[U] | None = None, *, table: str): # type: ignore
+  def new(cls, conn_str: str, type: type[U] | None = None, *, table: str, pool_size: int | None = None, max_overflow: int | None = None): # type: ignore
     from sqlalchemy import create_engine
-    engine = create_engine(conn_str)
+    engine = create_engine(conn_str, **pool_options(pool_size, max_overflow))
     return cls(type or bytes, engine, table=table) # type: ignore
 
   async def delete(self, key: str):
-    key = self.prefix_ + key
-    from sqlmodel import Session, select
     try:
-      with Session(self.engine) as session:
-        stmt = select(self.Table).where(self.Table.key == key)
-        row = session.exec(stmt).first()
-        if row is None:
-          raise InexistentItem(key)
-        session.delete(row)
-        session.commit()
+      with self.engine.begin() as conn:
+        result = conn.execute(self.delete_one(key))
     except DatabaseError as e:
       raise KVError(e) from e
+    if result.rowcount == 0:
+      raise InexistentItem(key)
 
   async def read(self, key: str) -> T:
-    from sqlmodel import Session, select
-    key = self.prefix_ + key
     try:
-      with Session(self.engine) as session:
-        stmt = select(self.Table).where(self.Table.key == key)
-        row = session.exec(stmt).first()
-        if row is None:
-          raise InexistentItem(key)
-        return self.parse(row.value)
+      with self.engine.connect() as conn:
+        row = conn.execute(self.read_one(key)).first()
+    except DatabaseError as e:
+      raise KVError(e) from e
+    if row is None:
+      raise InexistentItem(key)
+    return self.parse(row.value)
+
+  async def has(self, key: str) -> bool:
+    try:
+      with self.engine.connect() as conn:
+        return conn.execute(self.has_one(key)).first() is not None
     except DatabaseError as e:
       raise KVError(e) from e
 
   async def insert(self, key: str, value: T):
-    key = self.prefix_ + key
-    from sqlmodel import Session, select
     try:
-      with Session(self.engine) as session:
-        stmt = select(self.Table).where(self.Table.key == key)
-        row = session.exec(stmt).first()
-        if row is not None:
-          session.delete(row)
-        session.add(self.Table(key=key, value=self.dump(value)))
-        session.commit()
+      with self.engine.begin() as conn:
+        for stmt, params in self.write(self.rows([(key, value)])):
+          conn.execute(stmt, params)
+    except DatabaseError as e:
+      raise KVError(e) from e
+
+  async def read_many(self, keys: Sequence[str], *, max_concurrent: int = 16) -> list[T | None]:
+    full_keys = self.full_keys(keys)
+    try:
+      with self.engine.connect() as conn:
+        found = {}
+        for stmt in self.select_in(full_keys, 'key', 'value'):
+          for k, v in conn.execute(stmt):
+            found[k] = self.parse(v)
+        return [found.get(key) for key in full_keys]
+    except DatabaseError as e:
+      raise KVError(e) from e
+
+  async def insert_many(self, items: Mapping[str, T] | Iterable[tuple[str, T]], *, max_concurrent: int = 16):
+    if not (rows := self.rows(item_pairs(items))):
+      return
+    try:
+      with self.engine.begin() as conn:
+        for stmt, params in self.write(rows):
+          conn.execute(stmt, params)
+    except DatabaseError as e:
+      raise KVError(e) from e
+
+  async def delete_many(self, keys: Sequence[str], *, max_concurrent: int = 16):
+    try:
+      with self.engine.begin() as conn:
+        for stmt in self.delete_in(self.full_keys(keys)):
+          conn.execute(stmt)
     except DatabaseError as e:
       raise KVError(e) from e
 
-  async def keys(self) -> AsyncIterable[str]:
-    from sqlmodel import Session, select
+  async def has_many(self, keys: Sequence[str], *, max_concurrent: int = 16) -> list[bool]:
+    full_keys = self.full_keys(keys)
     try:
-      with Session(self.engine) as session:
-        stmt = select(self.Table.key).where(self.Table.key.like(self.prefix_ + '%'))
-        for key in session.exec(stmt).all():
-          yield key
+      with self.engine.connect() as conn:
+        found = set()
+        for stmt in self.select_in(full_keys, 'key'):
+          found.update(conn.execute(stmt).scalars())
+        return [key in found for key in full_keys]
+    except DatabaseError as e:
+      raise KVError(e) from e
+
+  async def keys(self, *, prefix: str = '', start: str | None = None, end: str | None = None, limit: int | None = None) -> AsyncIterable[str]:
+    """Keys in order, fetched in keyset-paginated queries of `PAGE_SIZE` (no connection is held while the caller consumes them)"""
+    where = self.where(prefix, start, end)
+    last = None
+    try:
+      while limit is None or limit > 0:
+        n = PAGE_SIZE if limit is None else min(PAGE_SIZE, limit)
+        with self.engine.connect() as conn:
+          keys = conn.execute(self.keys_page(where, n, last)).scalars().all()
+        for key in keys:
+          yield key.removeprefix(self.prefix_)
+        if len(keys) < n:
+          return
+        if limit is not None:
+          limit -= n
+        last = keys[-1]
     except DatabaseError as e:
       raise KVError(e) from e
 
   async def items(self, batch_size: int | None = None) -> AsyncIterable[tuple[str, T]]:
-    from sqlmodel import Session, select
     try:
-      with Session(self.engine) as session:
-        result = session.exec(select(self.Table).where(self.Table.key.like(self.prefix_ + '%')))
+      with self.engine.connect() as conn:
+        result = conn.execute(self.select_all())
         while (batch := result.fetchmany(batch_size)) != []:
-          for row in batch:
-            yield row.key, self.parse(row.value)
+          for key, value in batch:
+            yield key.removeprefix(self.prefix_), self.parse(value)
     except DatabaseError as e:
       raise KVError(e) from e
 
-
   async def clear(self):
-    from sqlmodel import Session, delete
     try:
-      with Session(self.engine) as session:
-        session.execute(delete(self.Table))
-        session.commit()
+      with self.engine.begin() as conn:
+        conn.execute(self.delete_all())
     except DatabaseError as e:
       raise KVError(e) from e
-    
-  
-  def prefixed(self, prefix: str):
-    new_prefix = self.prefix_.rstrip('/') + '/' + prefix.strip('/')
-    return replace(self, prefix_=new_prefix.lstrip('/'))
\ No newline at end of file
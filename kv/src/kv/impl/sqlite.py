@@ -0,0 +1,247 @@
+from typing_extensions import TypeVar, Generic, Callable, ParamSpec, Coroutine, Any, Sequence, Mapping, Iterable, AsyncIterable, overload
+from dataclasses import dataclass, field, replace
+from concurrent.futures import ThreadPoolExecutor
+import sqlite3
+import threading
+import asyncio
+from kv import KV, KVError, InexistentItem
+from kv._abc import item_pairs, prefix_end
+from kv.serialization import Parse, Dump, Serializers, default, serializers
+
+T = TypeVar('T')
+U = TypeVar('U')
+R = TypeVar('R')
+Ps = ParamSpec('Ps')
+
+MAX_PARAMS = 500
+"""Max. keys bound in a single `IN (...)` clause"""
+PAGE_SIZE = 1000
+"""Rows fetched per query when iterating keys/items"""
+
+def sqlite_safe(f: Callable[Ps, Coroutine[Any, Any, R]]):
+  async def wrapper(*args: Ps.args, **kwargs: Ps.kwargs) -> R:
+    try:
+      return await f(*args, **kwargs)
+    except sqlite3.Error as e:
+      raise KVError(str(e)) from e
+  return wrapper
+
+def connect(path: str) -> sqlite3.Connection:
+  conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False, cached_statements=256)
+  conn.execute('PRAGMA journal_mode=WAL')
+  conn.execute('PRAGMA synchronous=NORMAL')
+  conn.execute('PRAGMA busy_timeout=5000')
+  return conn
+
+class Pool:
+  """Worker threads (started on first use), each with its own `sqlite3` connection (and prepared statement cache)"""
+  def __init__(self, path: str, max_workers: int = 4):
+    self.path = path
+    self.max_workers = max_workers
+    self.executor: ThreadPoolExecutor | None = None
+    self.closed = False
+    self.local = threading.local()
+    self.conns: list[sqlite3.Connection] = []
+    self.lock = threading.Lock()
+
+  def conn(self) -> sqlite3.Connection:
+    if (conn := getattr(self.local, 'conn', None)) is None:
+      conn = self.local.conn = connect(self.path)
+      with self.lock:
+        self.conns.append(conn)
+    return conn
+
+  async def run(self, f: Callable[[sqlite3.Connection], U]) -> U:
+    """Run `f(conn)` on a worker thread"""
+    if self.closed:
+      raise KVError('SQLiteKV is closed')
+    if self.executor is None:
+      self.executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix='kv-sqlite')
+    try:
+      fut = asyncio.get_running_loop().run_in_executor(self.executor, lambda: f(self.conn()))
+    except RuntimeError as e: # executor shut down (e.g. at interpreter exit)
+      raise KVError(str(e)) from e
+    return await fut
+
+  def close(self):
+    self.closed = True
+    if self.executor is not None:
+      self.executor.shutdown(wait=True)
+    with self.lock:
+      for conn in self.conns:
+        conn.close()
+      self.conns.clear()
+
+@dataclass
+class SQLiteKV(KV[T], Generic[T]):
+  """`KV` over a SQLite table `(key TEXT PRIMARY KEY, value BLOB)`, using the stdlib `sqlite3` directly.
+  Runs in WAL mode, with single-statement upserts. Queries run off the event loop, on a pool of threads with one connection each
+  """
+  path: str
+  table: str = 'kv'
+  parse: Parse[T] = default[T].parse
+  dump: Dump[T] = default[T].dump
+  prefix_: str = ''
+  max_workers: int = 4
+  pool: Pool = field(default=None, repr=False) # type: ignore
+
+  @classmethod
+  @overload
+  def new(cls, path: str, *, table: str = 'kv', compression: str | None = None) -> 'SQLiteKV[bytes]':
+    ...
+  @classmethod
+  @overload
+  def new(cls, path: str, type: type[U] | None = None, *, table: str = 'kv', format: str = 'json', compression: str | None = None) -> 'SQLiteKV[U]':
+    ...
+  @classmethod
+  def new(cls, path: str, type: type | None = None, *, table: str = 'kv', format: str = 'json', compression: str | None = None) -> 'SQLiteKV[Any]':
+    return SQLiteKV(path, table, **serializers(type or bytes, format=format, compression=compression))
+
+  def __post_init__(self):
+    if self.pool is None:
+      self.pool = Pool(self.path, self.max_workers)
+      conn = connect(self.path)
+      conn.execute(f'CREATE TABLE IF NOT EXISTS "{self.table}" (key TEXT PRIMARY KEY, value BLOB NOT NULL) WITHOUT ROWID')
+      conn.close()
+    t = f'"{self.table}"'
+    self.sql_read = f'SELECT value FROM {t} WHERE key = ?'
+    self.sql_has = f'SELECT 1 FROM {t} WHERE key = ? LIMIT 1'
+    self.sql_upsert = f'INSERT INTO {t} (key, value) VALUES (?, ?) ON CONFLICT (key) DO UPDATE SET value = excluded.value'
+    self.sql_delete = f'DELETE FROM {t} WHERE key = ?'
+
+  def __repr__(self):
+    return f'SQLiteKV(path={self.path!r}, table={self.table!r}, prefix={self.prefix_!r})'
+
+  def bounds(self, prefix: str = '', start: str | None = None, end: str | None = None) -> tuple[str, str | None]:
+    """Range `[lo, hi)` of full keys starting with `prefix_ + prefix`, within `[start, end)` (`hi = None` if unbounded)"""
+    lo = self.prefix_ + prefix
+    hi = prefix_end(lo)
+    if start is not None:
+      lo = max(lo, self.prefix_ + start)
+    if end is not None:
+      hi = self.prefix_ + end if hi is None else min(hi, self.prefix_ + end)
+    return lo, hi
+
+  @staticmethod
+  def range(lo: str, hi: str | None, lo_op: str = '>=') -> tuple[str, tuple[str, ...]]:
+    """SQL condition (and params) matching keys in `[lo, hi)`"""
+    if hi is None:
+      return f'key {lo_op} ?', (lo,)
+    return f'key {lo_op} ? AND key < ?', (lo, hi)
+
+  @sqlite_safe
+  async def insert(self, key: str, value: T):
+    data = self.dump(value)
+    await self.pool.run(lambda conn: conn.execute(self.sql_upsert, (self.prefix_ + key, data)))
+
+  @sqlite_safe
+  async def read(self, key: str) -> T:
+    row = await self.pool.run(lambda conn: conn.execute(self.sql_read, (self.prefix_ + key,)).fetchone())
+    if row is None:
+      raise InexistentItem(key)
+    return self.parse(row[0])
+
+  @sqlite_safe
+  async def has(self, key: str) -> bool:
+    row = await self.pool.run(lambda conn: conn.execute(self.sql_has, (self.prefix_ + key,)).fetchone())
+    return row is not None
+
+  @sqlite_safe
+  async def delete(self, key: str):
+    count = await self.pool.run(lambda conn: conn.execute(self.sql_delete, (self.prefix_ + key,)).rowcount)
+    if count == 0:
+      raise InexistentItem(key)
+
+  def select_in(self, keys: Sequence[str], columns: str) -> Callable[[sqlite3.Connection], list[Any]]:
+    def select(conn: sqlite3.Connection):
+      rows = []
+      for i in range(0, len(keys), MAX_PARAMS):
+        chunk = keys[i:i+MAX_PARAMS]
+        sql = f'SELECT {columns} FROM "{self.table}" WHERE key IN ({",".join("?"*len(chunk))})'
+        rows.extend(conn.execute(sql, chunk).fetchall())
+      return rows
+    return select
+
+  @sqlite_safe
+  async def read_many(self, keys: Sequence[str], *, max_concurrent: int = 16) -> list[T | None]:
+    full_keys = [self.prefix_ + key for key in keys]
+    rows = await self.pool.run(self.select_in(full_keys, 'key, value'))
+    found = {k: self.parse(v) for k, v in rows}
+    return [found.get(key) for key in full_keys]
+
+  @sqlite_safe
+  async def has_many(self, keys: Sequence[str], *, max_concurrent: int = 16) -> list[bool]:
+    full_keys = [self.prefix_ + key for key in keys]
+    found = {k for k, in await self.pool.run(self.select_in(full_keys, 'key'))}
+    return [key in found for key in full_keys]
+
+  def transaction(self, sql: str, params: list[tuple]) -> Callable[[sqlite3.Connection], None]:
+    def run(conn: sqlite3.Connection):
+      conn.execute('BEGIN IMMEDIATE')
+      try:
+        conn.executemany(sql, params)
+      except:
+        conn.execute('ROLLBACK')
+        raise
+      conn.execute('COMMIT')
+    return run
+
+  @sqlite_safe
+  async def insert_many(self, items: Mapping[str, T] | Iterable[tuple[str, T]], *, max_concurrent: int = 16):
+    pairs = item_pairs(items)
+    rows = [(self.prefix_ + k, self.dump(v)) for k, v in pairs]
+    await self.pool.run(self.transaction(self.sql_upsert, rows))
+
+  @sqlite_safe
+  async def delete_many(self, keys: Sequence[str], *, max_concurrent: int = 16):
+    await self.pool.run(self.transaction(self.sql_delete, [(self.prefix_ + key,) for key in keys]))
+
+  async def pages(
+    self, columns: str, *, prefix: str = '', start: str | None = None,
+    end: str | None = None, limit: int | None = None
+  ) -> AsyncIterable[tuple]:
+    """Iterate rows in key order, `PAGE_SIZE` at a time, without holding a transaction open in between"""
+    lo, hi = self.bounds(prefix, start, end)
+    lo_op = '>='
+    try:
+      while limit is None or limit > 0:
+        n = PAGE_SIZE if limit is None else min(PAGE_SIZE, limit)
+        cond, params = self.range(lo, hi, lo_op)
+        sql = f'SELECT {columns} FROM "{self.table}" WHERE {cond} ORDER BY key LIMIT {n}'
+        rows = await self.pool.run(lambda conn: conn.execute(sql, params).fetchall())
+        for row in rows:
+          yield row
+        if len(rows) < n:
+          return
+        if limit is not None:
+          limit -= n
+        lo, lo_op = rows[-1][0], '>'
+    except sqlite3.Error as e:
+      raise KVError(str(e)) from e
+
+  async def keys(self, *, prefix: str = '', start: str | None = None, end: str | None = None, limit: int | None = None):
+    async for key, in self.pages('key', prefix=prefix, start=start, end=end, limit=limit):
+      yield key.removeprefix(self.prefix_)
+
+  async def items(self):
+    async for key, value in self.pages('key, value'):
+      yield key.removeprefix(self.prefix_), self.parse(value)
+
+  @sqlite_safe
+  async def clear(self):
+    cond, params = self.range(*self.bounds())
+    await self.pool.run(lambda conn: conn.execute(f'DELETE FROM "{self.table}" WHERE {cond}', params))
+
+  def raw(self) -> 'SQLiteKV[bytes]':
+    return replace(self, parse=default.parse, dump=default.dump) # type: ignore
+
+  def raw_serializers(self):
+    return Serializers(parse=self.parse, dump=self.dump)
+
+  def prefixed(self, prefix: str):
+    """Same key layout as `PrefixedKV` (`prefix + key`, nested prefixes joined by `/`)"""
+    new_prefix = (self.prefix_.rstrip('/') + '/' + prefix.strip('/')).lstrip('/') if self.prefix_ else prefix
+    return replace(self, prefix_=new_prefix)
+
+  async def aclose(self):
+    await asyncio.to_thread(self.pool.close)
@@ -1,6 +1,7 @@
-from typing import TypeVar, Generic
+from typing import TypeVar, Generic, Sequence, Mapping, Iterable, AsyncIterable
 from dataclasses import dataclass, replace
 from kv import KV, LocatableKV, KVError
+from kv._abc import list_keys, item_pairs
 
 T = TypeVar('T')
 
@@ -20,15 +21,63 @@ class PrefixedKV(KV[T], Generic[T]):
   
   def has(self, key: str):
     return self.kv.has(self.prefix_ + key)
+
+  def read_many(self, keys: Sequence[str], *, max_concurrent: int = 16):
+    return self.kv.read_many([self.prefix_ + key for key in keys], max_concurrent=max_concurrent)
+  
+  def insert_many(self, items: Mapping[str, T] | Iterable[tuple[str, T]], *, max_concurrent: int = 16):
+    pairs = item_pairs(items)
+    return self.kv.insert_many([(self.prefix_ + k, v) for k, v in pairs], max_concurrent=max_concurrent)
+  
+  def delete_many(self, keys: Sequence[str], *, max_concurrent: int = 16):
+    return self.kv.delete_many([self.prefix_ + key for key in keys], max_concurrent=max_concurrent)
   
+  def has_many(self, keys: Sequence[str], *, max_concurrent: int = 16):
+    return self.kv.has_many([self.prefix_ + key for key in keys], max_concurrent=max_concurrent)
+  
+  def read_stream(self, key: str, **kwargs):
+    return self.kv.read_stream(self.prefix_ + key, **kwargs)
+
+  def insert_stream(self, key: str, chunks: AsyncIterable[bytes], **kwargs):
+    return self.kv.insert_stream(self.prefix_ + key, chunks, **kwargs)
+
+  def raw(self) -> 'PrefixedKV[bytes] | None':
+    if (raw := self.kv.raw()) is not None:
+      return PrefixedKV(self.prefix_, raw)
+
+  def raw_serializers(self):
+    return self.kv.raw_serializers()
+
   def prefixed(self, prefix: str):
     new_prefix = self.prefix_.rstrip('/') + '/' + prefix.strip('/')
     return replace(self, prefix_=new_prefix.lstrip('/'))
   
-  async def keys(self):
-    async for key in self.kv.keys():
-      if key.startswith(self.prefix_):
-        yield key.removeprefix(self.prefix_)
+  async def keys(self, *, prefix: str = '', start: str | None = None, end: str | None = None, limit: int | None = None):
+    p = self.prefix_
+    keys = list_keys(
+      self.kv, prefix=p + prefix, limit=limit,
+      start=None if start is None else p + start,
+      end=None if end is None else p + end,
+    )
+    async for key in keys:
+      yield key.removeprefix(p)
+
+  async def items(self, *, batch_size: int = 256):
+    """Items under the prefix: keys are listed with the store's prefix filter, values fetched with `read_many` in batches"""
+    batch = []
+    async for key in self.keys():
+      batch.append(key)
+      if len(batch) >= batch_size:
+        for k, v in zip(batch, await self.read_many(batch)):
+          if v is not None:
+            yield k, v
+        batch = []
+    for k, v in zip(batch, await self.read_many(batch) if batch else []):
+      if v is not None:
+        yield k, v
+
+  def aclose(self):
+    return self.kv.aclose()
 
   def url(self, key: str, /, *, expiry=None):
     if not isinstance(self.kv, LocatableKV):
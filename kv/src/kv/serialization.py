@@ -1,4 +1,4 @@
-from typing_extensions import TypeVar, Callable, Generic, TypedDict
+from typing_extensions import TypeVar, Callable, Generic, TypedDict, Any, cast
 from kv import InvalidData
 
 T = TypeVar('T')
@@ -18,22 +18,147 @@ class default(Generic[T]):
   @staticmethod
   def dump(value: T) -> bytes:
     return value # type: ignore
-  
+
   serializers = Serializers(parse=parse, dump=dump)
-  
 
-def serializers(type: type[T]) -> Serializers[T]:
-  """Get default serializers for a type"""
-  from pydantic import RootModel, ValidationError
-  Root = RootModel[type]
+Codec = tuple[Callable[[bytes], bytes], Callable[[bytes], bytes]]
+"""`(compress, decompress)`"""
+
+FAST_TYPES = (str, int, float, bool, dict, list, Any)
+"""Types (de)serialized directly by the underlying library, skipping pydantic (which is used as fallback for any value they reject)"""
+
+def fast_serializers(type: type[T], loads: Callable[[bytes], Any], dumps: Callable[[Any], bytes], fallback: Serializers[T]) -> Serializers[T]:
+  if type not in FAST_TYPES:
+    return fallback
+  fallback_parse, fallback_dump = fallback['parse'], fallback['dump']
 
-  def parse(data: bytes):
+  def parse(data: bytes) -> T:
     try:
-      return Root.model_validate_json(data).root
+      value = loads(data)
+      if type is Any or value.__class__ is type:
+        return value
+    except Exception: # malformed data: let the fallback raise `InvalidData`
+      ...
+    return fallback_parse(data)
+
+  def dump(value: T) -> bytes:
+    if type is Any or value.__class__ is type:
+      try:
+        return dumps(value)
+      except TypeError: # e.g. nested non-JSON types
+        ...
+    return fallback_dump(value)
+
+  return Serializers(parse=parse, dump=dump)
+
+def json_serializers(type: type[T]) -> Serializers[T]:
+  """JSON, validated with pydantic. Uses `orjson` for `FAST_TYPES`, if installed"""
+  from pydantic import TypeAdapter, ValidationError
+  adapter = TypeAdapter(type)
+
+  def parse(data: bytes) -> T:
+    if isinstance(data, memoryview): # e.g. memory-mapped files: pydantic only parses `bytes`/`str`
+      data = data.tobytes()
+    try:
+      return adapter.validate_json(data)
     except ValidationError as e:
       raise InvalidData(str(e)) from e
-    
-  def dump(value: T):
-    return Root(value).model_dump_json(exclude_none=True).encode()
-  
-  return Serializers(parse=parse, dump=dump)
\ No newline at end of file
+
+  def dump(value: T) -> bytes:
+    return adapter.dump_json(value, exclude_none=True)
+
+  s = Serializers(parse=parse, dump=dump)
+  try:
+    import orjson
+  except ImportError:
+    return s
+  # leave types whose encoding differs from pydantic's (e.g. datetimes) to the fallback
+  opts = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS | orjson.OPT_PASSTHROUGH_SUBCLASS
+  return fast_serializers(type, orjson.loads, lambda x: orjson.dumps(x, option=opts), s)
+
+def msgpack_serializers(type: type[T]) -> Serializers[T]:
+  """MessagePack (requires `msgpack`), validated with pydantic"""
+  import msgpack
+  from pydantic import TypeAdapter, ValidationError
+  adapter = TypeAdapter(type)
+  loads = lambda data: msgpack.unpackb(data, strict_map_key=False)
+
+  def parse(data: bytes) -> T:
+    try:
+      return adapter.validate_python(loads(data))
+    except (ValidationError, ValueError, msgpack.UnpackException) as e:
+      raise InvalidData(str(e)) from e
+
+  def dumps(value: Any) -> bytes:
+    return cast(bytes, msgpack.packb(value))
+
+  def dump(value: T) -> bytes:
+    return dumps(adapter.dump_python(value, mode='json', exclude_none=True))
+
+  return fast_serializers(type, loads, dumps, Serializers(parse=parse, dump=dump))
+
+def gzip_codec() -> Codec:
+  import gzip
+  return gzip.compress, gzip.decompress
+
+def zstd_codec() -> Codec:
+  """Requires `zstandard`"""
+  import zstandard
+  return zstandard.compress, zstandard.decompress
+
+def lz4_codec() -> Codec:
+  """Requires `lz4`"""
+  import lz4.frame
+  return lz4.frame.compress, lz4.frame.decompress
+
+formats: dict[str, Callable[[type], Serializers]] = {
+  'json': json_serializers,
+  'msgpack': msgpack_serializers,
+}
+"""Registry of serialization formats: `name -> make_serializers(type)`. Add entries to support custom formats"""
+
+compressions: dict[str, Callable[[], Codec]] = {
+  'gzip': gzip_codec,
+  'zstd': zstd_codec,
+  'lz4': lz4_codec,
+}
+"""Registry of compression codecs: `name -> () -> (compress, decompress)`. Add entries to support custom codecs"""
+
+def compressed(s: Serializers[T], compression: str) -> Serializers[T]:
+  if compression not in compressions:
+    raise ValueError(f'Unknown compression: {compression}. Available: {", ".join(compressions)}')
+  compress, decompress = compressions[compression]()
+  parse_, dump_ = s['parse'], s['dump']
+
+  def parse(data: bytes) -> T:
+    try:
+      data = decompress(data)
+    except Exception as e: # each library raises its own errors
+      raise InvalidData(f'Invalid {compression} data: {e}') from e
+    return parse_(data)
+
+  def dump(value: T) -> bytes:
+    return compress(dump_(value))
+
+  return Serializers(parse=parse, dump=dump)
+
+_cache: dict = {}
+
+def serializers(type: type[T], *, format: str = 'json', compression: str | None = None) -> Serializers[T]:
+  """Get serializers for a type. Cached, so that `KV`s of the same type share (identical) serializers
+  - `format`: name in `formats` (`'json'` or `'msgpack'`). `bytes` are stored as-is, regardless
+  - `compression`: name in `compressions` (`'gzip'`, `'zstd'` or `'lz4'`), or `None`
+  """
+  try:
+    return _cache[type, format, compression]
+  except KeyError:
+    s = _cache[type, format, compression] = make_serializers(type, format=format, compression=compression)
+    return s
+  except TypeError: # unhashable type
+    return make_serializers(type, format=format, compression=compression)
+
+def make_serializers(type: type[T], *, format: str = 'json', compression: str | None = None) -> Serializers[T]:
+  if format not in formats:
+    raise ValueError(f'Unknown format: {format}. Available: {", ".join(formats)}')
+  s = Serializers(parse=default.parse, dump=default.dump) if type is bytes else formats[format](type)
+  return compressed(s, compression) if compression else s # type: ignore
@@ -0,0 +1,201 @@
+from typing_extensions import TypeVar, Generic, Sequence, Mapping, Iterable, AsyncIterable
+from dataclasses import dataclass
+from bisect import bisect
+import hashlib
+import asyncio
+from kv import KV
+from kv._abc import filter_keys, list_keys, gather_bounded, item_pairs
+
+T = TypeVar('T')
+U = TypeVar('U')
+
+def hash64(s: str) -> int:
+  """Stable (across processes and platforms) 64-bit hash"""
+  return int.from_bytes(hashlib.blake2b(s.encode(), digest_size=8).digest(), 'big')
+
+@dataclass
+class Failed:
+  error: BaseException
+
+DONE = object()
+
+async def merge(iters: Sequence[AsyncIterable[U]], *, buffer: int = 256) -> AsyncIterable[U]:
+  """Interleave `iters`, consuming them concurrently (at most `buffer` values are read ahead)"""
+  queue: asyncio.Queue = asyncio.Queue(maxsize=buffer)
+
+  async def pump(it: AsyncIterable[U]):
+    try:
+      async for x in it:
+        await queue.put(x)
+    except asyncio.CancelledError:
+      raise
+    except BaseException as e:
+      await queue.put(Failed(e))
+      return
+    finally:
+      if (aclose := getattr(it, 'aclose', None)) is not None:
+        await aclose()
+    await queue.put(DONE)
+
+  tasks = [asyncio.create_task(pump(it)) for it in iters]
+  pending = len(tasks)
+  try:
+    while pending:
+      x = await queue.get()
+      if x is DONE:
+        pending -= 1
+      elif isinstance(x, Failed):
+        raise x.error
+      else:
+        yield x
+  finally:
+    for task in tasks:
+      task.cancel()
+
+@dataclass
+class ShardedKV(KV[T], Generic[T]):
+  """`KV` spreading keys across `shards`, routed by a consistent-hash ring with `vnodes` virtual nodes per shard.
+  Adding a shard only moves about `1/N` of the keys (see `rebalance`).
+  - `names`: stable shard identities placed on the ring (default: their indices). Keep them when reordering or replacing shards
+
+  ```
+  kv = ShardedKV([KV.of('redis://host-a', dict), KV.of('redis://host-b', dict)])
+  # or
+  kv = KV.of('shard://redis://host-a|redis://host-b', dict)
+  ```
+  """
+  shards: Sequence[KV[T]]
+  vnodes: int = 128
+  names: Sequence[str] | None = None
+
+  def __post_init__(self):
+    if not self.shards:
+      raise ValueError('ShardedKV needs at least one shard')
+    names = self.names or [str(i) for i in range(len(self.shards))]
+    if len(names) != len(self.shards) or len(set(names)) != len(names):
+      raise ValueError('`names` must be unique, one per shard')
+    ring = sorted((hash64(f'{name}#{v}'), i) for i, name in enumerate(names) for v in range(self.vnodes))
+    self.points = [h for h, _ in ring]
+    self.owners = [i for _, i in ring]
+
+  def __repr__(self):
+    return f'ShardedKV({list(self.shards)!r})'
+
+  def shard_index(self, key: str) -> int:
+    """Index of the shard owning `key`"""
+    return self.owners[bisect(self.points, hash64(key)) % len(self.points)]
+
+  def shard(self, key: str) -> KV[T]:
+    """Shard owning `key`"""
+    return self.shards[self.shard_index(key)]
+
+  def group(self, keys: Sequence[str]) -> dict[int, list[int]]:
+    """Positions of `keys`, grouped by shard index"""
+    groups: dict[int, list[int]] = {}
+    for j, key in enumerate(keys):
+      groups.setdefault(self.shard_index(key), []).append(j)
+    return groups
+
+  def insert(self, key: str, value: T):
+    return self.shard(key).insert(key, value)
+
+  def read(self, key: str):
+    return self.shard(key).read(key)
+
+  def delete(self, key: str):
+    return self.shard(key).delete(key)
+
+  def has(self, key: str):
+    return self.shard(key).has(key)
+
+  def read_stream(self, key: str, **kwargs):
+    return self.shard(key).read_stream(key, **kwargs)
+
+  def insert_stream(self, key: str, chunks: AsyncIterable[bytes], **kwargs):
+    return self.shard(key).insert_stream(key, chunks, **kwargs)
+
+  async def read_many(self, keys: Sequence[str], *, max_concurrent: int = 16) -> list[T | None]:
+    """One `read_many` per shard, in parallel"""
+    results: list = [None] * len(keys)
+    async def read(i: int, pos: list[int]):
+      values = await self.shards[i].read_many([keys[j] for j in pos], max_concurrent=max_concurrent)
+      for j, value in zip(pos, values):
+        results[j] = value
+    await asyncio.gather(*[read(i, pos) for i, pos in self.group(keys).items()])
+    return results
+
+  async def has_many(self, keys: Sequence[str], *, max_concurrent: int = 16) -> list[bool]:
+    """One `has_many` per shard, in parallel"""
+    results = [False] * len(keys)
+    async def has(i: int, pos: list[int]):
+      found = await self.shards[i].has_many([keys[j] for j in pos], max_concurrent=max_concurrent)
+      for j, x in zip(pos, found):
+        results[j] = x
+    await asyncio.gather(*[has(i, pos) for i, pos in self.group(keys).items()])
+    return results
+
+  async def insert_many(self, items: Mapping[str, T] | Iterable[tuple[str, T]], *, max_concurrent: int = 16):
+    """One `insert_many` per shard, in parallel"""
+    pairs = list(item_pairs(items))
+    groups = self.group([k for k, _ in pairs])
+    await asyncio.gather(*[
+      self.shards[i].insert_many([pairs[j] for j in pos], max_concurrent=max_concurrent)
+      for i, pos in groups.items()
+    ])
+
+  async def delete_many(self, keys: Sequence[str], *, max_concurrent: int = 16):
+    """One `delete_many` per shard, in parallel"""
+    await asyncio.gather(*[
+      self.shards[i].delete_many([keys[j] for j in pos], max_concurrent=max_concurrent)
+      for i, pos in self.group(keys).items()
+    ])
+
+  async def keys(self, *, prefix: str = '', start: str | None = None, end: str | None = None, limit: int | None = None):
+    """Keys of all shards (filtered by each shard), listed concurrently. Not ordered across shards"""
+    keys = merge([list_keys(shard, prefix=prefix, start=start, end=end, limit=limit) for shard in self.shards])
+    async for key in filter_keys(keys, limit=limit):
+      yield key
+
+  def items(self) -> AsyncIterable[tuple[str, T]]:
+    """Items of all shards, listed concurrently"""
+    return merge([shard.items() for shard in self.shards])
+
+  async def clear(self):
+    await asyncio.gather(*[shard.clear() for shard in self.shards])
+
+  async def rebalance(self, *, drain: Sequence[KV[T]] = (), max_concurrent: int = 16, batch_size: int = 256) -> int:
+    """Move misplaced keys to the shard owning them (with `copy`, then `delete_many`). Returns the number of keys moved.
+    - `drain`: shards being removed (not in `shards`), whose keys are all moved
+
+    Run it after adding shards. Meanwhile, reads of keys not moved yet miss (they're still on their old shard)
+    """
+    moved = 0
+    for src in [*self.shards, *drain]:
+      batch: list[str] = []
+      async def flush():
+        nonlocal moved
+        misplaced = [(key, dst) for key in batch if (dst := self.shard(key)) is not src]
+        await gather_bounded((src.copy(key, dst, key) for key, dst in misplaced), max_concurrent=max_concurrent)
+        await src.delete_many([key for key, _ in misplaced], max_concurrent=max_concurrent)
+        moved += len(misplaced)
+      async for key in src.keys():
+        batch.append(key)
+        if len(batch) >= batch_size:
+          await flush()
+          batch = []
+      if batch:
+        await flush()
+    return moved
+
+  def raw(self) -> 'ShardedKV[bytes] | None':
+    raws = [shard.raw() for shard in self.shards]
+    if all(raw is not None for raw in raws):
+      return ShardedKV(raws, self.vnodes, self.names) # type: ignore
+
+  def raw_serializers(self):
+    s = self.shards[0].raw_serializers()
+    if all(shard.raw_serializers() == s for shard in self.shards):
+      return s
+
+  async def aclose(self):
+    await asyncio.gather(*[shard.aclose() for shard in self.shards])
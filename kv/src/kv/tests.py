@@ -1,5 +1,6 @@
 from typing import TypeVar, Mapping
 from kv import KV, InexistentItem
+from kv._abc import KeyFilters
 
 T = TypeVar('T')
 
@@ -51,6 +52,39 @@ async def test(kv: KV[T], items: Mapping[str, T]):
     else:
       errors.append(f'Point delete error. Expected error. Got: {r}')
 
+  await kv.insert_many(items)
+  if (rs := await kv.read_many(list(items.keys()) + ['inexistent'])) != [*items.values(), None]:
+    errors.append(f'Batch read error. Expected: {[*items.values(), None]} Got: {rs}')
+
+  if (hs := await kv.has_many(['inexistent', *items.keys()])) != [False] + [True]*len(items):
+    errors.append(f'Batch has error. Expected: {[False] + [True]*len(items)} Got: {hs}')
+
+  filters: list[KeyFilters] = [{'prefix': 'a'}, {'start': 'b'}, {'end': 'b'}, {'start': 'a', 'end': 'c', 'prefix': 'b'}]
+  for f in filters:
+    expected = {k for k in items if k.startswith(f.get('prefix', '')) and f.get('start', k) <= k and k < f.get('end', k + '\0')}
+    if (ks := {key async for key in kv.keys(**f)}) != expected:
+      errors.append(f'Filtered keys error ({f}). Expected: {expected} Got: {ks}')
+  if len(ks := [key async for key in kv.keys(limit=1)]) != 1:
+    errors.append(f'Limited keys error. Expected 1 key. Got: {ks}')
+
+  if not await kv.has('a') or await kv.has('inexistent'):
+    errors.append('Has error')
+
+  if kv.raw() is not None or all(isinstance(v, bytes) for v in items.values()): # streams carry stored bytes
+    data = b''.join([chunk async for chunk in kv.read_stream('a', chunk_size=2)])
+    async def chunks():
+      for i in range(0, len(data), 3):
+        yield data[i:i+3]
+    await kv.insert_stream('stream', chunks())
+    if (r := await kv.read('stream')) != items['a']:
+      errors.append(f'Stream error. Expected: {items["a"]} Got: {r}')
+    await kv.delete('stream')
+
+  await kv.delete_many(list(items.keys()))
+  keys = [key async for key in kv.keys()]
+  if keys != []:
+    errors.append(f'Batch delete error. Expected: [] Got: {keys}')
+
   for k, v in items.items():
     await kv.insert(k, v)
 
@@ -0,0 +1,288 @@
+from typing_extensions import TypeVar, Generic, Literal, Sequence, Mapping, Iterable, AsyncIterable
+from dataclasses import dataclass, field
+from contextlib import asynccontextmanager
+from weakref import WeakValueDictionary
+import asyncio
+import time
+from kv import KV, InexistentItem
+from kv._abc import filter_keys, list_keys, gather_bounded, item_pairs
+from kv.cache import LRU, LFU
+
+T = TypeVar('T')
+
+@dataclass
+class TieredKV(KV[T], Generic[T]):
+  """Hot/cold `KV`: reads hit `fast` first and promote from `slow` on miss. Writes go to `fast`, and a background task demotes cold keys to `slow`.
+  - `max_items`: keys kept in the fast tier. Beyond it, the coldest ones (per `policy`, `'lru'` or `'lfu'`) are demoted
+  - `max_age`: seconds without access after which a key is demoted (`None` for no limit)
+  - `interval`: seconds between demotion passes (`None` to only demote on `demote()` calls)
+
+  Keys in `fast` take precedence over `slow`. Written keys live only in `fast` until demoted.
+  """
+  fast: KV[T]
+  slow: KV[T]
+  max_items: int | None = 10_000
+  max_age: float | None = None
+  policy: Literal['lru', 'lfu'] = 'lfu'
+  interval: float | None = 60
+  hits: int = field(default=0, init=False)
+  misses: int = field(default=0, init=False)
+  promotions: int = field(default=0, init=False)
+  demotions: int = field(default=0, init=False)
+
+  def __post_init__(self):
+    self.order = LRU() if self.policy == 'lru' else LFU()
+    self.accessed: dict[str, float] = {}
+    """Fast tier keys -> last access time"""
+    self.clean: set[str] = set()
+    """Fast tier keys promoted (thus also in the slow tier) and not written since. Demoting any other key copies it first"""
+    self.locks: WeakValueDictionary[str, asyncio.Lock] = WeakValueDictionary()
+    self.loaded = False
+    self.task: asyncio.Task | None = None
+    self.error: BaseException | None = None
+    """Last background demotion error"""
+
+  def __repr__(self):
+    return f'TieredKV(fast={self.fast!r}, slow={self.slow!r}, items={len(self.accessed)})'
+
+  @asynccontextmanager
+  async def locked(self, keys: Iterable[str]):
+    """Serialize writes, promotions and demotions of `keys` (locked in order, to avoid deadlocks)"""
+    locks = [self.locks.setdefault(key, asyncio.Lock()) for key in sorted(set(keys))]
+    acquired = []
+    try:
+      for lock in locks:
+        await lock.acquire()
+        acquired.append(lock)
+      yield
+    finally:
+      for lock in acquired:
+        lock.release()
+
+  def touch(self, key: str):
+    if key in self.accessed:
+      self.order.touch(key)
+    else:
+      self.order.add(key)
+    self.accessed[key] = time.monotonic()
+    self.start()
+
+  def untrack(self, key: str):
+    if self.accessed.pop(key, None) is not None:
+      self.order.remove(key)
+    self.clean.discard(key)
+
+  def written(self, key: str):
+    self.touch(key)
+    self.clean.discard(key)
+
+  async def promote(self, keys: Sequence[str]) -> list[T | None]:
+    """Read `keys` from the slow tier, copying the found ones into the fast tier"""
+    async with self.locked(keys):
+      values = await self.fast.read_many(keys) # may have been written/promoted meanwhile
+      missing = [key for key, value in zip(keys, values) if value is None]
+      found = {}
+      for key, value in zip(missing, await self.slow.read_many(missing) if missing else []):
+        if value is not None:
+          found[key] = value
+      if found:
+        await self.fast.insert_many(found)
+      for key in found:
+        self.touch(key)
+        self.clean.add(key)
+      self.promotions += len(found)
+    return [found.get(key) if value is None else value for key, value in zip(keys, values)]
+
+  async def read(self, key: str) -> T:
+    try:
+      value = await self.fast.read(key)
+    except InexistentItem:
+      self.misses += 1
+      [value] = await self.promote([key])
+      if value is None:
+        raise InexistentItem(key)
+      return value
+    self.hits += 1
+    self.touch(key)
+    return value
+
+  async def read_many(self, keys: Sequence[str], *, max_concurrent: int = 16) -> list[T | None]:
+    values = await self.fast.read_many(keys, max_concurrent=max_concurrent)
+    missing = list(dict.fromkeys(key for key, value in zip(keys, values) if value is None))
+    for key, value in zip(keys, values):
+      if value is not None:
+        self.touch(key)
+    self.hits += len(keys) - len(missing)
+    self.misses += len(missing)
+    if not missing:
+      return values
+    promoted = dict(zip(missing, await self.promote(missing)))
+    return [promoted[key] if value is None else value for key, value in zip(keys, values)]
+
+  async def has(self, key: str) -> bool:
+    return await self.fast.has(key) or await self.slow.has(key)
+
+  async def has_many(self, keys: Sequence[str], *, max_concurrent: int = 16) -> list[bool]:
+    fast = await self.fast.has_many(keys, max_concurrent=max_concurrent)
+    missing = [key for key, has in zip(keys, fast) if not has]
+    slow = iter(await self.slow.has_many(missing, max_concurrent=max_concurrent) if missing else [])
+    return [has or next(slow) for has in fast]
+
+  async def insert(self, key: str, value: T):
+    async with self.locked([key]):
+      await self.fast.insert(key, value)
+      self.written(key)
+
+  async def insert_many(self, items: Mapping[str, T] | Iterable[tuple[str, T]], *, max_concurrent: int = 16):
+    pairs = list(item_pairs(items))
+    async with self.locked(k for k, _ in pairs):
+      await self.fast.insert_many(pairs, max_concurrent=max_concurrent)
+      for key, _ in pairs:
+        self.written(key)
+
+  async def insert_stream(self, key: str, chunks: AsyncIterable[bytes], **kwargs):
+    async with self.locked([key]):
+      await self.fast.insert_stream(key, chunks, **kwargs)
+      self.written(key)
+
+  async def read_stream(self, key: str, **kwargs):
+    """Streams from whichever tier has `key`, without promoting it"""
+    kv = self.fast if await self.fast.has(key) else self.slow
+    async for chunk in kv.read_stream(key, **kwargs):
+      yield chunk
+
+  async def delete(self, key: str):
+    async with self.locked([key]):
+      fast, slow = await asyncio.gather(self.fast.has(key), self.slow.has(key))
+      if not fast and not slow:
+        raise InexistentItem(key)
+      await asyncio.gather(*[kv.delete(key) for kv, has in [(self.fast, fast), (self.slow, slow)] if has])
+      self.untrack(key)
+
+  async def delete_many(self, keys: Sequence[str], *, max_concurrent: int = 16):
+    async with self.locked(keys):
+      await asyncio.gather(
+        self.fast.delete_many(keys, max_concurrent=max_concurrent),
+        self.slow.delete_many(keys, max_concurrent=max_concurrent),
+      )
+      for key in keys:
+        self.untrack(key)
+
+  async def keys(self, *, prefix: str = '', start: str | None = None, end: str | None = None, limit: int | None = None):
+    """Keys of the fast tier, then the slow tier's not in the fast one"""
+    async def union():
+      seen = set()
+      async for key in list_keys(self.fast, prefix=prefix, start=start, end=end):
+        seen.add(key)
+        yield key
+      async for key in list_keys(self.slow, prefix=prefix, start=start, end=end):
+        if key not in seen:
+          yield key
+    async for key in filter_keys(union(), limit=limit):
+      yield key
+
+  async def items(self):
+    """Items of both tiers (without promoting them)"""
+    seen = set()
+    async for key, value in self.fast.items():
+      seen.add(key)
+      yield key, value
+    async for key, value in self.slow.items():
+      if key not in seen:
+        yield key, value
+
+  async def clear(self):
+    await asyncio.gather(self.fast.clear(), self.slow.clear())
+    self.order.clear()
+    self.accessed.clear()
+    self.clean.clear()
+
+  async def load(self):
+    """Track the keys already in the fast tier (e.g. a `FilesystemKV` from a previous run), so they get demoted too"""
+    async for key in self.fast.keys():
+      if key not in self.accessed:
+        self.touch(key)
+    self.loaded = True
+
+  def victims(self) -> list[str]:
+    """Untrack and return the keys to demote: older than `max_age`, then the coldest beyond `max_items`"""
+    victims = []
+    if self.max_age is not None:
+      now = time.monotonic()
+      victims = [key for key, t in self.accessed.items() if now - t > self.max_age]
+      for key in victims:
+        self.accessed.pop(key)
+        self.order.remove(key)
+    while self.max_items is not None and len(self.accessed) > self.max_items:
+      key = self.order.victim()
+      victims.append(key)
+      self.accessed.pop(key)
+      self.order.remove(key)
+    return victims
+
+  async def demote_key(self, key: str) -> bool:
+    async with self.locked([key]):
+      if key in self.accessed: # accessed again since picked
+        return False
+      try:
+        if key not in self.clean:
+          await self.fast.copy(key, self.slow, key)
+        await self.fast.delete(key)
+      except InexistentItem:
+        ...
+      except BaseException:
+        self.touch(key) # keep it tracked, to retry in the next pass
+        raise
+      self.clean.discard(key)
+      return True
+
+  async def demote(self, *, max_concurrent: int = 16) -> int:
+    """Run a demotion pass: move cold keys to the slow tier (copying them only if written since promoted). Returns the number of keys demoted"""
+    if not self.loaded:
+      await self.load()
+    demoted = await gather_bounded((self.demote_key(key) for key in self.victims()), max_concurrent=max_concurrent)
+    self.demotions += sum(demoted)
+    return sum(demoted)
+
+  async def _demote_loop(self, interval: float):
+    while True:
+      await asyncio.sleep(interval)
+      try:
+        await self.demote()
+      except asyncio.CancelledError:
+        raise
+      except BaseException as e:
+        self.error = e
+
+  def start(self):
+    """Start the background demotion task (if `interval` is set). Called on the first access"""
+    if self.task is None and self.interval is not None:
+      self.task = asyncio.get_running_loop().create_task(self._demote_loop(self.interval))
+
+  async def flush(self):
+    """Demote every key to the slow tier"""
+    max_items, self.max_items = self.max_items, 0
+    try:
+      await self.demote()
+    finally:
+      self.max_items = max_items
+
+  async def aclose(self):
+    """Stop the background task and close both tiers. Keys in the fast tier stay there (see `flush`)"""
+    if self.task is not None:
+      self.task.cancel()
+      self.task = None
+    await asyncio.gather(self.fast.aclose(), self.slow.aclose())
+
+  @property
+  def hit_rate(self) -> float:
+    """Fraction of reads served by the fast tier"""
+    total = self.hits + self.misses
+    return self.hits / total if total else 0.0
+
+  @property
+  def stats(self) -> dict[str, float]:
+    return dict(
+      hits=self.hits, misses=self.misses, hit_rate=self.hit_rate,
+      promotions=self.promotions, demotions=self.demotions, fast_items=len(self.accessed),
+    )
@@ -0,0 +1,147 @@
+from typing_extensions import TypeVar, Callable, Any, AsyncIterable, cast
+from dataclasses import dataclass, field
+import os
+import json
+import time
+import asyncio
+from kv import KV
+
+T = TypeVar('T')
+
+@dataclass
+class CopyStats:
+  """Progress of a `transfer`"""
+  copied: int = 0
+  """Items written to the destination"""
+  skipped: int = 0
+  """Keys skipped because the checkpoint already had them"""
+  missing: int = 0
+  """Keys that disappeared between listing and reading"""
+  total: int | None = None
+  """Expected number of keys (if known), used for the ETA"""
+  started: float = field(default_factory=time.monotonic)
+
+  @property
+  def elapsed(self) -> float:
+    return time.monotonic() - self.started
+
+  @property
+  def rate(self) -> float:
+    """Items copied per second"""
+    return self.copied / self.elapsed if self.elapsed > 0 else 0.0
+
+  @property
+  def eta(self) -> float | None:
+    """Estimated seconds left (`None` if `total` is unknown)"""
+    if self.total is None or self.rate == 0:
+      return None
+    return max(self.total - self.copied - self.skipped - self.missing, 0) / self.rate
+
+  def __str__(self):
+    s = f'{self.copied} copied ({self.rate:.0f}/s)'
+    if self.skipped:
+      s += f', {self.skipped} skipped'
+    if self.missing:
+      s += f', {self.missing} missing'
+    if (eta := self.eta) is not None:
+      s += f', ETA {eta:.0f}s'
+    return s
+
+class Checkpoint:
+  """Append-only file of transferred keys (one JSON string per line), to resume interrupted transfers"""
+  def __init__(self, path: str):
+    self.path = path
+    self.done: set[str] = set()
+    if os.path.exists(path):
+      with open(path) as f:
+        for line in f:
+          try:
+            self.done.add(json.loads(line))
+          except json.JSONDecodeError: # torn last line
+            ...
+    self.file = open(path, 'a')
+
+  def add(self, keys: list[str]):
+    self.file.write(''.join(json.dumps(key) + '\n' for key in keys))
+    self.file.flush()
+
+  def close(self):
+    self.file.close()
+
+async def batched(keys: AsyncIterable[str], size: int) -> AsyncIterable[list[str]]:
+  batch = []
+  async for key in keys:
+    batch.append(key)
+    if len(batch) >= size:
+      yield batch
+      batch = []
+  if batch:
+    yield batch
+
+async def from_list(keys: list[str]) -> AsyncIterable[str]:
+  for key in keys:
+    yield key
+
+async def transfer(
+  src: KV[T], dst: KV[T], *, move: bool = False,
+  max_concurrent: int = 16, batch_size: int = 256,
+  checkpoint: str | None = None, total: int | None = None,
+  progress: Callable[[CopyStats], Any] | None = None,
+) -> CopyStats:
+  """Copy (or move) every item of `src` into `dst`, as a bounded pipeline:
+  keys are listed lazily into batches of `batch_size`, and `max_concurrent` workers each
+  `read_many` a batch from `src`, `insert_many` it into `dst` (and `delete_many` it from `src`, if `move`).
+  At most `2 * max_concurrent` batches are pending at any time, regardless of the number of keys.
+  If `move`, the keys are listed up front instead, since deleting while listing could make some backends skip keys.
+  If both stores serialize values the same way (`KV.raw_compatible`), bytes are copied as-is, without parsing.
+  - `checkpoint`: path of a file recording transferred keys. Re-running with the same file skips them
+  - `total`: expected number of keys, for `CopyStats.eta`
+  - `progress`: called with the running `CopyStats` after every batch
+  """
+  if src.raw_compatible(dst): # same encoding: move bytes, skipping parse/dump
+    src, dst = src.raw(), dst.raw() # type: ignore
+  stats = CopyStats(total=total)
+  ckpt = Checkpoint(checkpoint) if checkpoint else None
+  queue: asyncio.Queue[list[str] | None] = asyncio.Queue(maxsize=2 * max_concurrent)
+
+  async def produce():
+    keys = src.keys()
+    if move:
+      keys = from_list([key async for key in keys])
+    async for batch in batched(keys, batch_size):
+      if ckpt is not None:
+        pending = [key for key in batch if key not in ckpt.done]
+        stats.skipped += len(batch) - len(pending)
+        batch = pending
+      if batch:
+        await queue.put(batch)
+    for _ in range(max_concurrent):
+      await queue.put(None)
+
+  async def consume():
+    while (batch := await queue.get()) is not None:
+      values = await src.read_many(batch)
+      nones = [key for key, value in zip(batch, values) if value is None]
+      stored = set() # keys holding a `None` value, rather than missing
+      if nones:
+        stored = {key for key, has in zip(nones, await src.has_many(nones)) if has}
+      items = [(key, cast(T, value)) for key, value in zip(batch, values) if value is not None or key in stored]
+      await dst.insert_many(items)
+      if move:
+        await src.delete_many([key for key, _ in items])
+      stats.copied += len(items)
+      stats.missing += len(batch) - len(items)
+      if ckpt is not None:
+        ckpt.add(batch)
+      if progress is not None:
+        progress(stats)
+
+  tasks = [asyncio.create_task(produce())] + [asyncio.create_task(consume()) for _ in range(max_concurrent)]
+  try:
+    await asyncio.gather(*tasks)
+  finally:
+    for task in tasks:
+      task.cancel()
+    if ckpt is not None:
+      ckpt.close()
+  return stats